@@ -0,0 +1,68 @@
+"""
+Connection setup cost of a fresh psycopg2 connection per batch against reusing
+pooled connections.
+
+Reads the usual TOGDB_* environment variables.
+
+    python benchmarks/bench_connections.py --batch-size 500 --rounds 50
+"""
+import argparse
+import time
+
+import psycopg2
+
+from skit_labels.db import Database
+
+ROWS = 100_000
+
+
+def fresh_connections(rounds: int) -> float:
+    database = Database()
+    params = database.conn.get_dsn_parameters()
+    password = database.conn.info.password
+    database.close()
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        conn = psycopg2.connect(
+            host=params["host"],
+            port=params["port"],
+            database=params["dbname"],
+            user=params["user"],
+            password=password,
+        )
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.close()
+    return (time.perf_counter() - start) / rounds
+
+
+def pooled_connections(rounds: int) -> float:
+    database = Database(pool_size=2)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        with database.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+    elapsed = time.perf_counter() - start
+    database.close()
+    return elapsed / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    batches = ROWS // args.batch_size
+    fresh = fresh_connections(args.rounds)
+    pooled = pooled_connections(args.rounds)
+
+    print(f"batches per {ROWS} rows: {batches}")
+    print(f"fresh connection + query: {fresh * 1000:.2f} ms")
+    print(f"pooled connection + query: {pooled * 1000:.2f} ms")
+    print(f"saved per {ROWS} rows: {(fresh - pooled) * batches:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
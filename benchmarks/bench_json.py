@@ -0,0 +1,81 @@
+"""
+JSON backends on conversation task payloads: the standard library against
+orjson, which `skit_labels.codec` uses when it is installed.
+
+    python benchmarks/bench_json.py --rows 10000 --rounds 5
+"""
+import argparse
+import json
+import random
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from skit_labels import codec
+
+WORDS = ["hello", "yes", "no", "my", "account", "balance", "नमस्ते", "ठीक", "है", "please"]
+
+
+def conversation(i: int) -> dict:
+    alternatives = [
+        [
+            {
+                "confidence": round(random.random(), 4),
+                "transcript": " ".join(random.choices(WORDS, k=random.randint(2, 12))),
+            }
+            for _ in range(random.randint(1, 5))
+        ]
+    ]
+    return {
+        "call_uuid": f"call-{i // 10}",
+        "conversation_uuid": f"conversation-{i}",
+        "audio_url": f"https://example.com/audio/{i}.wav",
+        "state": random.choice(["INTRO", "COF", "PAYMENT", "END"]),
+        "reftime": "2022-01-01T10:00:00.123456+05:30",
+        "alternatives": alternatives,
+        "prediction": {"intents": [{"name": "_confirm_", "score": 0.8}]},
+    }
+
+
+def timed(fn, payloads, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for payload in payloads:
+            fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best / len(payloads) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    tasks = [conversation(i) for i in range(args.rows)]
+    encoded = [json.dumps(task) for task in tasks]
+
+    cases = [
+        ("decode", "json", json.loads, encoded),
+        ("encode", "json", json.dumps, tasks),
+    ]
+    if orjson is not None:
+        cases += [
+            ("decode", "orjson", orjson.loads, encoded),
+            ("encode", "orjson", lambda value: orjson.dumps(value).decode(), tasks),
+        ]
+    else:
+        print("orjson is not installed, only the standard library is measured.")
+
+    print(f"codec backend: {codec.BACKEND}, {args.rows} rows, {sum(map(len, encoded)) / args.rows:.0f} bytes per row")
+    for operation, backend, fn, payloads in sorted(cases):
+        print(f"{operation} {backend:>6}: {timed(fn, payloads, args.rounds):.2f} us per row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Reftime timezone conversion of a batch, row by row with `update_reftime`
+against the batched `update_reftimes`.
+
+    python benchmarks/bench_reftime.py --rows 100000 --batch-size 500 --timezone Asia/Kolkata
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+from skit_labels.db import update_reftime, update_reftimes
+
+
+def reftimes(n_rows: int):
+    start = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    return [
+        (start + timedelta(seconds=random.randint(0, 365 * 86400), microseconds=random.randint(0, 999999))).isoformat()
+        for _ in range(n_rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--timezone", default="Asia/Kolkata")
+    args = parser.parse_args()
+
+    random.seed(0)
+    tz = pytz.timezone(args.timezone)
+    values = reftimes(args.rows)
+    batches = [values[i : i + args.batch_size] for i in range(0, args.rows, args.batch_size)]
+
+    start = time.perf_counter()
+    per_row = [[update_reftime(reftime, tz) for reftime in batch] for batch in batches]
+    row_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = [update_reftimes(batch, tz) for batch in batches]
+    batch_elapsed = time.perf_counter() - start
+
+    assert per_row == batched
+    print(f"update_reftime:  {row_elapsed / args.rows * 1e6:.2f} us per row")
+    print(f"update_reftimes: {batch_elapsed / args.rows * 1e6:.2f} us per row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Load synthetic rows into `SqliteDatabase` the way a download does, one
+checkpointed commit per batch, with default settings and in bulk-load mode.
+Lookups by data_id are timed on the result.
+
+    python benchmarks/bench_sqlite.py --rows 1000000 --batch-size 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from contextlib import nullcontext
+
+from skit_labels.db import RawJSON, SqliteDatabase
+
+
+DATA = (
+    '{{"call_uuid": "call-{call}", "conversation_uuid": "conversation-{i}", '
+    '"audio_url": "https://example.com/audio/{i}.wav", "state": "COF", '
+    '"reftime": "2022-01-01T10:00:00+00:00", '
+    '"alternatives": "[[{{\\"confidence\\": 0.9, \\"transcript\\": \\"yes please\\"}}]]"}}'
+)
+TAG = RawJSON('["_confirm_"]')
+
+
+def batches(n_rows: int, batch_size: int):
+    # Pre-encoded like COPY downloads, so the timings are about sqlite.
+    for start in range(0, n_rows, batch_size):
+        ids = range(start + 1, min(start + batch_size, n_rows) + 1)
+        rows = [
+            (
+                i,
+                RawJSON(DATA.format(call=i // 10, i=i)),
+                TAG,
+                i % 10 == 0,
+                f"2022-01-{i % 28 + 1:02d}T10:00:00+00:00",
+                "1",
+            )
+            for i in ids
+        ]
+        yield (0, ids[-1]), rows
+
+
+def load(data, n_rows: int, bulk: bool):
+    _, path = tempfile.mkstemp(suffix=".sqlite")
+    sdb = SqliteDatabase(path)
+    sdb.start_download({"job_id": 1}, [(0, n_rows)])
+
+    start = time.perf_counter()
+    with sdb.bulk_load() if bulk else nullcontext():
+        for checkpoint, rows in data:
+            sdb.insert_rows(rows, checkpoint=checkpoint)
+        inserted = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+
+    random.seed(0)
+    ids = [random.randint(1, n_rows) for _ in range(200)]
+    start = time.perf_counter()
+    for i in ids:
+        sdb.conn.execute("SELECT data FROM data WHERE data_id = ?", (i,)).fetchone()
+    lookup = (time.perf_counter() - start) / len(ids)
+
+    sdb.conn.close()
+    size = os.path.getsize(path)
+    os.remove(path)
+    return inserted, elapsed, lookup, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    data = list(batches(args.rows, args.batch_size))
+    for name, bulk in [("default", False), ("bulk load", True)]:
+        inserted, elapsed, lookup, size = load(data, args.rows, bulk)
+        print(
+            f"{name:>9}: {args.rows / inserted:,.0f} rows/s, inserts {inserted:.1f} s, "
+            f"indexes {elapsed - inserted:.1f} s, lookup by data_id {lookup * 1000:.2f} ms, "
+            f"{size / 2**20:.0f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+Every download and upload path against local stand-ins: synthetic tog and
+labelstudio databases in a local Postgres, which are dropped and recreated,
+and an aiohttp stub of the tog and labelstudio APIs (see `stand_ins.py`).
+
+Each path runs in a process of its own and reports rows/s, peak RSS and the
+p50/p99 latency of its batches: the time between batches reaching the
+writer for downloads and the time of each request for uploads.
+
+Reads the usual TOGDB_* environment variables for the server, the tog
+database is --db and the labelstudio one --labelstudio-db. Both are dropped
+and recreated, the production labelstudio name is refused. Save a run with
+--save and pass it to --compare later to fail on throughput regressions.
+
+    python benchmarks/bench_suite.py --rows 100000 --save bench.json
+    python benchmarks/bench_suite.py --rows 100000 --compare bench.json
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from skit_labels import commands
+from skit_labels import constants as const
+from skit_labels.db import Database, SqliteDatabase
+from skit_labels.writers import JSONLWriter, ParquetWriter
+
+import stand_ins
+
+JOB_ID = 1
+SMALL_JOB_ID = 2
+PROJECT_ID = 1
+TOKEN = "benchmark"
+
+
+def count_rows(path: str) -> int:
+    if path.endswith(const.OUTPUT_FORMAT__CSV):
+        return len(pd.read_csv(path))
+    if path.endswith(const.OUTPUT_FORMAT__JSONL_GZ):
+        with gzip.open(path, "rt") as f:
+            return sum(1 for _ in f)
+    if path.endswith(const.OUTPUT_FORMAT__PARQUET):
+        return pd.read_parquet(path).shape[0]
+    if path.endswith(const.OUTPUT_FORMAT__SQLITE):
+        return SqliteDatabase(path).count()
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+def download(output_format: str, task_type=const.TASK_TYPE__CONVERSATION, **kwargs):
+    def prepare(args):
+        def run():
+            path, _ = commands.download_dataset_from_db(
+                str(JOB_ID), task_type, output_format=output_format, **kwargs
+            )
+            return path
+
+        return run
+
+    return prepare
+
+
+def download_sqlite(args):
+    def run():
+        _, path, _ = commands.download_dataset(str(JOB_ID), const.TASK_TYPE__CONVERSATION)
+        return path
+
+    return run
+
+
+def download_jobs(args):
+    def run():
+        path, _ = commands.download_datasets(
+            [str(JOB_ID), str(SMALL_JOB_ID)],
+            const.TASK_TYPE__CONVERSATION,
+            output_format=const.OUTPUT_FORMAT__JSONL,
+            workers=args.workers,
+        )
+        return path
+
+    return run
+
+
+def sync(args):
+    _, path, _ = commands.download_dataset(str(JOB_ID), const.TASK_TYPE__CONVERSATION)
+    # Tag a tenth of the job again.
+    database = Database()
+    with database.conn, database.conn.cursor() as cur:
+        cur.execute(
+            "UPDATE jobs_task SET tagged_time = now() WHERE job_id = %s AND id %% 10 = 1",
+            (JOB_ID,),
+        )
+        n_rows = cur.rowcount
+    database.close()
+
+    def run():
+        commands.sync_dataset(path)
+        return n_rows
+
+    return run
+
+
+def download_labelstudio_db(args):
+    # Downloads tell labelstudio apart by its database name, this process
+    # only ever talks to the benchmark one.
+    const.LABELSTUIO_DB = args.labelstudio_db
+
+    def run():
+        path, _ = commands.download_dataset_from_db(
+            str(PROJECT_ID), const.TASK_TYPE__CONVERSATION, db=args.labelstudio_db
+        )
+        return path
+
+    return run
+
+
+def export_labelstudio(args):
+    def run():
+        path, _ = asyncio.run(
+            commands.download_dataset_from_labelstudio(args.stub_url, TOKEN, PROJECT_ID)
+        )
+        return path
+
+    return run
+
+
+def upload(fn: Callable, job_id: int):
+    def prepare(args):
+        _, path = tempfile.mkstemp(suffix=const.OUTPUT_FORMAT__CSV)
+        stand_ins.conversations(args.upload_rows).to_csv(path, index=False)
+
+        def run():
+            _, n_rows = asyncio.run(fn(path, args.stub_url, TOKEN, str(job_id)))
+            return n_rows
+
+        return run
+
+    return prepare
+
+
+# Name to a function preparing a case, which returns the timed work. That
+# returns either the rows it handled or the file it wrote.
+CASES: Dict[str, Callable] = {
+    "tog sqlite": download_sqlite,
+    "tog csv": download(const.OUTPUT_FORMAT__CSV),
+    "tog parquet": download(const.OUTPUT_FORMAT__PARQUET),
+    "tog jsonl.gz dict": download(const.OUTPUT_FORMAT__JSONL_GZ, const.TASK_TYPE__DICT),
+    "tog jsonl dict copy": download(const.OUTPUT_FORMAT__JSONL, const.TASK_TYPE__DICT, copy=True),
+    "tog jsonl dict fields": download(
+        const.OUTPUT_FORMAT__JSONL, const.TASK_TYPE__DICT, fields=["state", "reftime"]
+    ),
+    "tog jsonl workers": lambda args: download(const.OUTPUT_FORMAT__JSONL, workers=args.workers)(args),
+    "tog jsonl asyncio": lambda args: download(
+        const.OUTPUT_FORMAT__JSONL, workers=args.workers, engine=const.ENGINE__ASYNCIO
+    )(args),
+    "tog jsonl job ids": download_jobs,
+    "tog sync": sync,
+    "labelstudio db csv": download_labelstudio_db,
+    "labelstudio export": export_labelstudio,
+    "tog upload": upload(commands.upload_dataset_to_db, JOB_ID),
+    "labelstudio upload": upload(commands.upload_dataset_to_labelstudio, PROJECT_ID),
+}
+
+
+class BatchTimer:
+    """
+    Record when batches reach a writer and how long upload requests take.
+    """
+
+    WRITERS = [
+        (SqliteDatabase, "insert_rows"),
+        (SqliteDatabase, "upsert_rows"),
+        (JSONLWriter, "insert_rows"),
+        (ParquetWriter, "insert_rows"),
+    ]
+    REQUESTS = [(commands, "upload_dataset"), (commands, "upload_file")]
+
+    def __init__(self):
+        self.arrivals: List[float] = []
+        self.requests: List[float] = []
+
+    def latencies(self, start: float) -> List[float]:
+        if self.requests:
+            return self.requests
+        return np.diff([start] + self.arrivals).tolist()
+
+    @contextmanager
+    def patched(self):
+        originals = [(owner, name, getattr(owner, name)) for owner, name in self.WRITERS + self.REQUESTS]
+        for owner, name, fn in originals[: len(self.WRITERS)]:
+            setattr(owner, name, self._arrival(fn))
+        for owner, name, fn in originals[len(self.WRITERS) :]:
+            setattr(owner, name, self._request(fn))
+        try:
+            yield self
+        finally:
+            for owner, name, fn in originals:
+                setattr(owner, name, fn)
+
+    def _arrival(self, fn):
+        def wrapper(*args, **kwargs):
+            self.arrivals.append(time.perf_counter())
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    def _request(self, fn):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.requests.append(time.perf_counter() - start)
+
+        return wrapper
+
+
+def reset_peak_rss():
+    # Linux only, elsewhere the peak includes the preparation of a case.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(args) -> dict:
+    timer = BatchTimer()
+    run = CASES[args.case](args)
+    reset_peak_rss()
+    with timer.patched():
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+    peak = peak_rss_mb()
+
+    if isinstance(result, str):
+        n_rows = count_rows(result)
+        os.remove(result)
+    else:
+        n_rows = result
+    latencies = timer.latencies(start) or [elapsed]
+    return {
+        "rows": n_rows,
+        "seconds": elapsed,
+        "rows_per_s": n_rows / elapsed,
+        "peak_rss_mb": peak,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        "batches": len(latencies),
+    }
+
+
+def run_suite(args) -> Dict[str, dict]:
+    server = Database(db="postgres")
+    server.close()
+    params = {key: value for key, value in server.params.items() if key != "database"}
+    stand_ins.check_local(params["host"])
+    print(f"Creating stand-ins with {args.rows} rows in {args.db} and {args.labelstudio_db}", file=sys.stderr)
+    stand_ins.create_tog(params, args.db, {JOB_ID: args.rows, SMALL_JOB_ID: args.rows // 4})
+    stand_ins.create_labelstudio(params, args.labelstudio_db, PROJECT_ID, args.rows)
+
+    results = {}
+    with stand_ins.StubServer(args.rows) as stub:
+        for name in args.cases or CASES:
+            command = [
+                sys.executable,
+                __file__,
+                "--case",
+                name,
+                "--stub-url",
+                stub.url,
+                "--workers",
+                str(args.workers),
+                "--upload-rows",
+                str(args.upload_rows),
+                "--labelstudio-db",
+                args.labelstudio_db,
+            ]
+            process = subprocess.run(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                env={**os.environ, const.TOGDB_DB: args.db},
+            )
+            if process.returncode:
+                print(f"{name} failed:\n{process.stderr[-2000:]}", file=sys.stderr)
+                continue
+            results[name] = json.loads(process.stdout.splitlines()[-1])
+            print(format_result(name, results[name]), flush=True)
+    return results
+
+
+def format_result(name: str, result: dict) -> str:
+    return (
+        f"{name:>22}: {result['rows']:>8} rows {result['rows_per_s']:>10,.0f} rows/s "
+        f"peak RSS {result['peak_rss_mb']:>6.0f} MB  batches p50 {result['p50_ms']:>8.1f} ms "
+        f"p99 {result['p99_ms']:>8.1f} ms"
+    )
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> bool:
+    """
+    Print the change in throughput against `baseline`, False if any case got
+    slower by more than `tolerance`.
+    """
+    ok = True
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result["rows_per_s"] / baseline[name]["rows_per_s"] - 1
+        regressed = change < -tolerance
+        ok = ok and not regressed
+        print(f"{name:>22}: {change:+.1%} rows/s{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows of the main tog job and labelstudio project.")
+    parser.add_argument("--upload-rows", type=int, default=20_000)
+    parser.add_argument("--db", type=str, default="skit_labels_bench", help="Tog database to create, replacing any of that name.")
+    parser.add_argument(
+        "--labelstudio-db",
+        type=str,
+        default="skit_labels_bench_ls",
+        help="Labelstudio database to create, replacing any of that name.",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), help="Run only these cases.")
+    parser.add_argument("--save", type=str, help="Write results as json to this file.")
+    parser.add_argument("--compare", type=str, help="Results of an earlier run to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Slowdown in rows/s counted as a regression.")
+    parser.add_argument("--case", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--stub-url", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args)))
+        return
+
+    results = run_suite(args)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Local stand-ins for the services skit-labels talks to, used by
+`bench_suite.py`: synthetic tog and labelstudio databases in a local Postgres
+and an aiohttp stub of the tog and labelstudio HTTP APIs.
+"""
+import asyncio
+import io
+import threading
+
+import pandas as pd
+import psycopg2
+from aiohttp import web
+
+from skit_labels import codec
+from skit_labels import constants as const
+
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+# Never dropped, a local labelstudio may keep its data there.
+PROTECTED_DATABASES = {const.LABELSTUIO_DB}
+
+TOG_SCHEMA = """
+CREATE TABLE jobs_job (
+    id serial PRIMARY KEY, name text, description text, config jsonb,
+    language text, is_active bool DEFAULT true, "taskType" text
+);
+CREATE TABLE jobs_data (
+    id serial PRIMARY KEY, data jsonb, data_id text, created_at timestamptz DEFAULT now()
+);
+CREATE TABLE jobs_task (
+    id serial PRIMARY KEY, job_id int REFERENCES jobs_job (id),
+    data_id int REFERENCES jobs_data (id), tag text, is_gold bool DEFAULT false,
+    tagged_time timestamptz
+);
+CREATE INDEX ON jobs_task (job_id, data_id);
+"""
+
+LABELSTUDIO_SCHEMA = """
+CREATE TABLE project (id serial PRIMARY KEY, title text);
+CREATE TABLE task (id serial PRIMARY KEY, project_id int REFERENCES project (id), data jsonb);
+CREATE TABLE task_completion (
+    id serial PRIMARY KEY, task_id int REFERENCES task (id), result jsonb,
+    created_at timestamptz DEFAULT now(), updated_at timestamptz DEFAULT now()
+);
+CREATE INDEX ON task (project_id);
+CREATE INDEX ON task_completion (task_id);
+"""
+
+# Conversation data about the size of production rows: a few ASR
+# alternatives, a prediction and a raw payload which most consumers ignore.
+# `%%` as it is part of queries with parameters.
+TOG_DATA = """
+jsonb_build_object(
+    'call_uuid', 'call-' || g / 10,
+    'conversation_uuid', 'conversation-' || g,
+    'audio_url', 'https://example.com/audio/' || g || '.wav',
+    'state', (ARRAY['COF', 'INTRO', 'END', 'PAYMENT'])[1 + g %% 4],
+    'reftime', to_char(
+        timestamptz '2022-01-01 10:00:00+00' + g * interval '37 seconds',
+        'YYYY-MM-DD"T"HH24:MI:SS.US"+00:00"'
+    ),
+    'alternatives', jsonb_build_array(jsonb_build_array(
+        jsonb_build_object('transcript', 'yes please go ahead', 'confidence', 0.91),
+        jsonb_build_object('transcript', 'yes please go', 'confidence', 0.62),
+        jsonb_build_object('transcript', 'yes go ahead', 'confidence', 0.4)
+    )),
+    'prediction', jsonb_build_object('intent', '_confirm_', 'score', 0.87),
+    'data_source', (ARRAY['cal', 'ops'])[1 + g %% 2],
+    'raw_payload', repeat('x', 400)
+)
+"""
+
+LABELSTUDIO_RESULT = [
+    {"type": "taxonomy", "value": {"taxonomy": [["_confirm_"]]}, "to_name": "audio", "from_name": "tag"},
+    {"type": "choices", "value": {"choices": ["[GOLD] Ready for Training"]}, "to_name": "audio", "from_name": "gold-data"},
+]
+
+
+def check_local(host: str):
+    """
+    The stand-ins drop and recreate whole databases, refuse anything but a
+    local server.
+    """
+    if host not in LOCAL_HOSTS and not host.startswith("/"):
+        raise ValueError(f"Refusing to create benchmark databases on {host}, use a local Postgres.")
+
+
+def recreate_database(params: dict, name: str, schema: str):
+    if name in PROTECTED_DATABASES:
+        raise ValueError(f"Refusing to drop {name}, pick another name for the benchmark database.")
+    admin = psycopg2.connect(**{**params, "database": "postgres"})
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        cur.execute(f'CREATE DATABASE "{name}"')
+    admin.close()
+
+    conn = psycopg2.connect(**{**params, "database": name})
+    with conn, conn.cursor() as cur:
+        cur.execute(schema)
+    return conn
+
+
+def create_tog(params: dict, name: str, jobs: dict):
+    """
+    Create the tog database `name` with {job id: rows} conversation jobs,
+    nine in ten rows tagged and one in nine gold.
+    """
+    conn = recreate_database(params, name, TOG_SCHEMA)
+    with conn, conn.cursor() as cur:
+        for job_id, n_rows in jobs.items():
+            cur.execute(
+                """INSERT INTO jobs_job (id, name, description, config, language, "taskType")
+                VALUES (%s, %s, 'benchmark', '{}', 'en', 'conversation')""",
+                (job_id, f"bench-{job_id}"),
+            )
+            cur.execute(
+                f"""
+                WITH data AS (
+                    INSERT INTO jobs_data (data, data_id, created_at)
+                    SELECT {TOG_DATA}, g::text, now() - (g %% 90) * interval '1 day'
+                    FROM generate_series(1, %(rows)s) g
+                    RETURNING id
+                )
+                INSERT INTO jobs_task (job_id, data_id, tag, is_gold, tagged_time)
+                SELECT
+                    %(job_id)s,
+                    id,
+                    CASE WHEN id %% 10 = 0 THEN NULL
+                    ELSE '[{{"type": "intent", "value": "' || (ARRAY['_confirm_', '_cancel_', '_repeat_'])[1 + id %% 3] || '"}}]'
+                    END,
+                    id %% 9 = 0,
+                    CASE WHEN id %% 10 = 0 THEN NULL ELSE now() - (id %% 30) * interval '1 hour' END
+                FROM data
+                """,
+                {"job_id": job_id, "rows": n_rows},
+            )
+        cur.execute("SELECT setval('jobs_job_id_seq', (SELECT max(id) FROM jobs_job))")
+        cur.execute("ANALYZE")
+    conn.close()
+
+
+def create_labelstudio(params: dict, name: str, project_id: int, n_rows: int):
+    """
+    Create the labelstudio database `name` with one annotated project. Like
+    tasks imported from csv, alternatives are stored as a json string.
+    """
+    conn = recreate_database(params, name, LABELSTUDIO_SCHEMA)
+    with conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO project (id, title) VALUES (%s, 'benchmark')", (project_id,))
+        cur.execute(
+            f"""
+            WITH tasks AS (
+                INSERT INTO task (project_id, data)
+                SELECT %(project_id)s, {TOG_DATA} - 'raw_payload'
+                    || jsonb_build_object('alternatives', ({TOG_DATA} -> 'alternatives')::text)
+                FROM generate_series(1, %(rows)s) g
+                RETURNING id
+            )
+            INSERT INTO task_completion (task_id, result, created_at)
+            SELECT id, %(result)s::jsonb, now() - (id %% 30) * interval '1 hour' FROM tasks
+            """,
+            {"project_id": project_id, "rows": n_rows, "result": codec.dumps(LABELSTUDIO_RESULT)},
+        )
+        cur.execute("ANALYZE")
+    conn.close()
+
+
+def conversations(n_rows: int) -> pd.DataFrame:
+    """
+    Conversations as a csv download has them, for uploads and exports.
+    """
+    alternatives = codec.dumps(
+        [[{"transcript": "yes please go ahead", "confidence": 0.91}, {"transcript": "yes go ahead", "confidence": 0.4}]]
+    )
+    return pd.DataFrame(
+        {
+            "call_uuid": [f"call-{i // 10}" for i in range(n_rows)],
+            "conversation_uuid": [f"conversation-{i}" for i in range(n_rows)],
+            "audio_url": [f"https://example.com/audio/{i}.wav" for i in range(n_rows)],
+            "state": "COF",
+            "reftime": "2022-01-01T10:00:00+00:00",
+            "alternatives": alternatives,
+        }
+    )
+
+
+def labelstudio_export(n_rows: int) -> bytes:
+    """
+    A labelstudio csv export of `n_rows` annotated conversations.
+    """
+    df = conversations(n_rows)
+    # Exports hold alternatives json encoded once more.
+    df["alternatives"] = df["alternatives"].map(codec.dumps)
+    df["tag"] = codec.dumps(LABELSTUDIO_RESULT)
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+class StubServer:
+    """
+    aiohttp stub of the tog task upload and labelstudio import and export
+    endpoints, served from a thread on a free local port. Requests are
+    accepted without any checks beyond parsing the body.
+    """
+
+    def __init__(self, export_rows: int):
+        self.export = labelstudio_export(export_rows)
+        self.export_rows = export_rows
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    async def tog_tasks(self, request):
+        tasks = await request.json(loads=codec.loads)
+        return web.json_response({"count": len(tasks)})
+
+    async def project_import(self, request):
+        data = await request.post()
+        n_rows = data["file"].file.read().count(b"\n") - 1
+        return web.json_response({"task_count": n_rows}, status=201)
+
+    async def project_export(self, request):
+        return web.Response(body=self.export, content_type="text/csv")
+
+    async def _start(self):
+        app = web.Application(client_max_size=2**30)
+        app.router.add_post("/tog/tasks/", self.tog_tasks)
+        app.router.add_post("/api/projects/{project_id}/import", self.project_import)
+        app.router.add_get("/api/projects/{project_id}/export", self.project_export)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def __exit__(self, *args):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
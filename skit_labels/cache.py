@@ -0,0 +1,154 @@
+"""
+Local cache of downloaded datasets, keyed by the arguments of the download.
+
+Each entry is a directory named by the hash of its key, holding the
+downloaded file and an `entry.json` with the fingerprint of the source at
+download time, the dataset type, the file size and when it was last used.
+An entry is served only while the fingerprint the source reports now is the
+same, so a cache hit costs one small query. Least recently used entries are
+evicted once the cache grows past its size limit.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, List, Optional, Tuple
+
+from loguru import logger
+
+from skit_labels import constants as const
+
+ENTRY_FILE = "entry.json"
+
+
+def as_json(value: Any) -> Any:
+    """
+    Round trip a value through json the way it is stored in an entry or in
+    `SqliteDatabase` metadata.
+    """
+    return json.loads(json.dumps(value, default=str))
+
+
+def disk_usage(path: str) -> int:
+    """
+    Size of a file, or of every file under a directory.
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+class DatasetCache:
+    """
+    Downloaded files under `directory`, at most `max_size_mb` in total.
+    Cached files are shared by every download with the same key and must not
+    be modified.
+    """
+
+    def __init__(
+        self, directory: str = const.CACHE_DIR, max_size_mb: int = const.CACHE_SIZE_MB
+    ):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = int(max_size_mb) * 2**20
+
+    @staticmethod
+    def key(**params: Any) -> str:
+        return hashlib.sha256(
+            json.dumps(params, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _read_entry(self, key: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self._path(key), ENTRY_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_entry(self, key: str, entry: dict):
+        # Replaced atomically, other processes may be reading it.
+        path = os.path.join(self._path(key), ENTRY_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(entry, f)
+        os.replace(f"{path}.tmp", path)
+
+    def get(self, key: str, fingerprint: List[Any]) -> Optional[Tuple[str, str]]:
+        """
+        Return (file, dataset type) of a cached download whose source still
+        has the same `fingerprint`. Stale entries are removed.
+        """
+        entry = self._read_entry(key)
+        if entry is None:
+            return None
+        path = os.path.join(self._path(key), entry["file"])
+        if entry["fingerprint"] != as_json(fingerprint) or not os.path.exists(path):
+            logger.info(f"Cached download {key} is stale.")
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            return None
+        entry["used_at"] = time.time()
+        self._write_entry(key, entry)
+        return path, entry["dataset_type"]
+
+    def put(
+        self, key: str, fingerprint: List[Any], filepath: str, dataset_type: str
+    ) -> Tuple[str, str]:
+        """
+        Move a downloaded file into the cache and return its new location
+        along with the dataset type.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.directory, prefix=".")
+        name = os.path.basename(filepath)
+        shutil.move(filepath, os.path.join(staging, name))
+        entry = {
+            "file": name,
+            "fingerprint": as_json(fingerprint),
+            "dataset_type": dataset_type,
+            "size": disk_usage(os.path.join(staging, name)),
+            "used_at": time.time(),
+        }
+        with open(os.path.join(staging, ENTRY_FILE), "w") as f:
+            json.dump(entry, f)
+
+        shutil.rmtree(self._path(key), ignore_errors=True)
+        try:
+            os.rename(staging, self._path(key))
+        except OSError:
+            # Another process cached the same download in the meantime.
+            shutil.move(os.path.join(staging, name), filepath)
+            shutil.rmtree(staging, ignore_errors=True)
+            return filepath, dataset_type
+        self.evict(keep=key)
+        return os.path.join(self._path(key), name), dataset_type
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Remove least recently used entries, other than `keep`, until the
+        cache fits in its size limit.
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            if key.startswith("."):
+                # Staged by a `put` in progress.
+                continue
+            entry = self._read_entry(key)
+            if entry is not None:
+                entries.append((entry["used_at"], entry["size"], key))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, key in sorted(entries):
+            if size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            logger.info(f"Evicting cached download {key}.")
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            size -= entry_size
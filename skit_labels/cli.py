@@ -5,14 +5,20 @@ import argparse
 import asyncio
 import os
 import sys
+import time
 from ast import arg
+from contextlib import nullcontext
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
 import pytz
 
 from skit_labels import commands
 from skit_labels import constants as const
+from skit_labels import metrics
+from skit_labels import profiling
 from skit_labels import utils
+from skit_labels.cache import DatasetCache, disk_usage
 
 
 def is_timezone(value: str) -> str:
@@ -30,6 +36,16 @@ def is_numeric(value: str) -> str:
         raise argparse.ArgumentTypeError(f"{value} is not a numeric value.")
     return value
 
+def positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not an integer.")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"Expected at least 1, got {value}.")
+    return number
+
+
 def is_valid_data_label(data_label: str):
     if data_label not in const.VALID_DATA_LABELS:
         raise argparse.ArgumentTypeError(
@@ -45,14 +61,31 @@ def date_type(value: str):
         raise argparse.ArgumentTypeError(f"Invalid date {value}, expected YYYY-MM-DD.")
 
 
-def create_job_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
-    parser.add_argument(
+def filter_type(value: str) -> Tuple[str, str]:
+    key, sep, match = value.partition("=")
+    if not sep or not key.isidentifier():
+        raise argparse.ArgumentTypeError(f"Invalid filter {value}, expected key=value.")
+    return key, match
+
+
+def create_job_args(
+    parser: argparse.ArgumentParser, multiple_jobs: bool = False
+) -> argparse.ArgumentParser:
+    jobs = parser.add_mutually_exclusive_group(required=True) if multiple_jobs else parser
+    jobs.add_argument(
         "-j",
         "--job-id",
         type=is_numeric,
-        required=True,
+        required=not multiple_jobs,
         help="Id of the tog dataset that we want to download.",
     )
+    if multiple_jobs:
+        jobs.add_argument(
+            "--job-ids",
+            type=is_numeric,
+            nargs="+",
+            help="Ids of tog datasets to download together into one .sqlite, .parquet or .jsonl file with a job_id column.",
+        )
     parser.add_argument(
         "--start-date",
         type=date_type,
@@ -63,6 +96,59 @@ def create_job_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
         type=date_type,
         help="Filter items added to the dataset before this date. (exclusive)",
     )
+    return create_db_args(parser)
+
+
+def create_cache_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Serve the download from the local cache if the dataset hasn't changed since it was cached, cache it otherwise. Cached files are shared, don't modify them.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Directory of the local cache.",
+        default=os.environ.get(const.SKIT_CACHE_DIR, const.CACHE_DIR),
+    )
+    parser.add_argument(
+        "--cache-size-mb",
+        type=int,
+        help="Least recently used downloads are evicted once the cache is larger than this.",
+        default=os.environ.get(const.SKIT_CACHE_SIZE_MB, const.CACHE_SIZE_MB),
+    )
+    return parser
+
+
+def create_diagnostic_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument(
+        "--metrics-out",
+        type=str,
+        help="Write the time spent in each phase and the rows, bytes and retries counted to this json file.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        choices=const.PROFILES,
+        help="Profile the command and write the cpu or memory profile next to the output file.",
+    )
+    return parser
+
+
+def get_filters(args: argparse.Namespace) -> Dict[str, List[str]]:
+    filters = {}
+    for key, value in args.filter or []:
+        filters.setdefault(key, []).append(value)
+    if args.only_gold:
+        filters[const.FILTER__IS_GOLD] = ["true"]
+    return filters
+
+
+def get_cache(args: argparse.Namespace) -> Optional[DatasetCache]:
+    return DatasetCache(args.cache_dir, args.cache_size_mb) if args.cache else None
+
+
+def create_db_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
     parser.add_argument(
         "--db", type=str, help="Database name.", default=os.environ.get(const.TOGDB_DB)
     )
@@ -96,7 +182,7 @@ def create_job_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
 def add_job_args(fn):
     def wrapper(*args, **kwargs):
         parser = fn(*args, **kwargs)
-        return create_job_args(parser)
+        return create_job_args(parser, multiple_jobs=True)
 
     return wrapper
 
@@ -110,8 +196,8 @@ def build_dataset_from_tog_command(
         "--output-format",
         type=str,
         help="Store dataset in supported formats.",
-        choices=[".csv", ".sqlite"],
-        default=".csv",
+        choices=const.OUTPUT_FORMATS,
+        default=const.OUTPUT_FORMAT__CSV,
     )
     parser.add_argument(
         "-tz",
@@ -131,6 +217,63 @@ def build_dataset_from_tog_command(
         action="store_true",
         help="If provided, download all data instead of including untagged datapoints.",
     )
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=1,
+        help="Number of concurrent connections fetching disjoint id ranges of the job.",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        help="Sqlite file to download into. If it holds an interrupted download of the same job, continue from its last checkpoint.",
+    )
+    parser.add_argument(
+        "--sample-fraction",
+        type=float,
+        help="Download only this fraction of the job, sampled in the database by a hash of the data id so the same items are picked every time.",
+    )
+    parser.add_argument(
+        "--stratify-by",
+        type=str,
+        choices=const.STRATIFY_BY,
+        help="Take --sample-fraction of every tag instead of the whole job.",
+    )
+    parser.add_argument(
+        "--filter",
+        type=filter_type,
+        action="append",
+        help="Download only items matching key=value, checked in the database. The key is tag for a value anywhere in the tag, is_gold for true or false, or else a field of the task data. Repeat to match any of the values of a key and every key.",
+    )
+    parser.add_argument(
+        "--only-gold",
+        action="store_true",
+        help="Download only items marked as gold, same as --filter is_gold=true.",
+    )
+    parser.add_argument(
+        "--fields",
+        type=str,
+        nargs="+",
+        help="Keys of the task data to download, the rest is left in the database. Keys conversation tasks are built from are always kept. Only for conversation and dict tasks.",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Write this many files of roughly equal size, split by a stable hash of data_id, into a directory with a manifest.json of their row counts and checksums.",
+    )
+    parser.add_argument(
+        "--copy",
+        action="store_true",
+        help="Stream rows with Postgres COPY instead of paging a cursor. Fastest with --task-type dict.",
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        default=const.ENGINE__THREADS,
+        choices=const.ENGINES,
+        help="Fetch pages on --workers threads, or with asyncio on one event loop with --workers queries in flight.",
+    )
     parser.add_argument(
         "-tt",
         "--task-type",
@@ -139,7 +282,7 @@ def build_dataset_from_tog_command(
         help="Task type for deserialization.",
         choices=const.TASK_TYPES,
     )
-    return parser
+    return create_diagnostic_args(create_cache_args(parser))
 
 
 def build_dataset_from_labelstudio_command(
@@ -148,6 +291,7 @@ def build_dataset_from_labelstudio_command(
     parser.add_argument("--url", type=str, required=True, help="Service url where labelstudio is hosted.")
     parser.add_argument("--token", type=str, required=True, help="The authentication token from https://labelstud.io/api#section/Authentication.")
     parser.add_argument("--job-id", type=str, required=True, help="The labelstudio project-id to which the dataset belongs.")
+    return create_diagnostic_args(parser)
 
 
 def build_dataset_from_dvc_command(
@@ -163,7 +307,7 @@ def build_dataset_from_dvc_command(
         help="Remote. Required only if the repo "
         "hasn't set a default remote. This is usually a bucket name.",
     )
-    return parser
+    return create_diagnostic_args(parser)
 
 
 def build_download_command(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
@@ -234,7 +378,7 @@ def upload_dataset_to_labelstudio_command(
         help="The tagging type for the calls being uploaded",
     )
     
-    return parser
+    return create_diagnostic_args(parser)
 
 
 def upload_dataset_to_tog_command(
@@ -271,7 +415,43 @@ def upload_dataset_to_tog_command(
         required=True,
         help="The data label implying the source of data",
     )
-    return parser
+    return create_diagnostic_args(parser)
+
+
+def build_sync_command(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        required=True,
+        help="Sqlite file downloaded from tog that should be brought up to date.",
+    )
+    parser.add_argument(
+        "-j",
+        "--job-id",
+        type=is_numeric,
+        help="Id of the tog dataset. Defaults to the one recorded in the input file.",
+    )
+    parser.add_argument(
+        "-tt",
+        "--task-type",
+        type=str,
+        help="Task type for deserialization. Defaults to the one recorded in the input file.",
+        choices=const.TASK_TYPES,
+    )
+    parser.add_argument(
+        "-tz",
+        "--timezone",
+        type=is_timezone,
+        help="Timezone to parse datetime values. Defaults to the one recorded in the input file.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Number of items to download in a batch.",
+    )
+    return create_diagnostic_args(create_db_args(parser))
 
 
 def build_upload_command(parser: argparse.ArgumentParser) -> None:
@@ -313,16 +493,27 @@ def build_cli():
             help="Upload a dataset.",
         )
     )
-    create_job_args(
+    build_sync_command(
         command_parsers.add_parser(
-            const.DESCRIBE, help="Describe a dataset for a given tog dataset id."
+            const.SYNC,
+            help="Fetch rows added or tagged since the last download of a sqlite dataset.",
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter,
         )
     )
-    create_job_args(
-        command_parsers.add_parser(
-            const.STATS, help="Get tagged/untagged points for a given tog dataset id."
-        )
+    describe_parser = command_parsers.add_parser(
+        const.DESCRIBE, help="Describe a dataset for a given tog dataset id."
     )
+    create_diagnostic_args(create_job_args(describe_parser))
+    stats_parser = command_parsers.add_parser(
+        const.STATS, help="Get tagged/untagged points for a given tog dataset id."
+    )
+    stats_parser.add_argument(
+        "--breakdown",
+        action="append",
+        choices=const.STATS_BREAKDOWNS,
+        help="Also count gold items, or items per tag or per day they were added. Repeat for more than one.",
+    )
+    create_diagnostic_args(create_job_args(stats_parser))
     return parser
 
 
@@ -350,7 +541,40 @@ def upload_dataset(input_file, url, token, job_id, data_source, data_label = Non
 
 def cmd_to_str(args: argparse.Namespace) -> str:
     utils.configure_logger(args.verbosity)
-    if args.command == const.DOWNLOAD and args.data_source == const.SOURCE__DB:
+    if args.command == const.DOWNLOAD and args.data_source == const.SOURCE__DB and args.stratify_by and args.sample_fraction is None:
+        raise argparse.ArgumentTypeError("--stratify-by needs --sample-fraction.")
+    if args.command == const.DOWNLOAD and args.data_source == const.SOURCE__DB and args.job_ids:
+        if args.resume or args.shards > 1 or args.cache:
+            raise argparse.ArgumentTypeError("--resume, --shards and --cache can't be used with --job-ids.")
+        if args.output_format == const.OUTPUT_FORMAT__CSV:
+            raise argparse.ArgumentTypeError(
+                "--job-ids downloads into one .sqlite, .parquet or .jsonl file, pass one of them as --output-format."
+            )
+        if args.db == const.LABELSTUIO_DB:
+            raise argparse.ArgumentTypeError("--job-ids only downloads tog jobs, not labelstudio projects.")
+        return commands.download_datasets(
+            args.job_ids,
+            args.task_type,
+            args.timezone,
+            full=args.full,
+            batch_size=args.batch_size,
+            output_format=args.output_format,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            db=args.db,
+            host=args.host,
+            port=args.port,
+            user=args.user,
+            password=args.password,
+            workers=args.workers,
+            copy=args.copy,
+            engine=args.engine,
+            sample_fraction=args.sample_fraction,
+            stratify_by=args.stratify_by,
+            filters=get_filters(args),
+            fields=args.fields,
+        )
+    elif args.command == const.DOWNLOAD and args.data_source == const.SOURCE__DB:
         return commands.download_dataset_from_db(
             args.job_id,
             args.task_type,
@@ -365,6 +589,16 @@ def cmd_to_str(args: argparse.Namespace) -> str:
             port=args.port,
             user=args.user,
             password=args.password,
+            workers=args.workers,
+            resume=args.resume,
+            copy=args.copy,
+            engine=args.engine,
+            cache=get_cache(args),
+            shards=args.shards,
+            sample_fraction=args.sample_fraction,
+            stratify_by=args.stratify_by,
+            filters=get_filters(args),
+            fields=args.fields,
         )
     elif args.command == const.DOWNLOAD and args.data_source == const.SOURCE__DVC:
         return commands.download_dataset_from_dvc(args.repo, args.path, args.remote)
@@ -404,6 +638,19 @@ def cmd_to_str(args: argparse.Namespace) -> str:
             return (
                 f"Encountered {len(errors)} over {df_size}.\nSummary:\n{errors}."
             )
+    elif args.command == const.SYNC:
+        return commands.sync_dataset(
+            args.input,
+            job_id=args.job_id,
+            task_type=args.task_type,
+            timezone=args.timezone,
+            batch_size=args.batch_size,
+            db=args.db,
+            host=args.host,
+            port=args.port,
+            user=args.user,
+            password=args.password,
+        )
     elif args.command == const.DESCRIBE:
         return commands.describe_dataset(
             args.job_id,
@@ -418,21 +665,86 @@ def cmd_to_str(args: argparse.Namespace) -> str:
     elif args.command == const.STATS:
         return commands.stat_dataset(
             args.job_id,
+            start_date=args.start_date,
+            end_date=args.end_date,
             db=args.db,
             host=args.host,
             port=args.port,
             user=args.user,
             password=args.password,
+            breakdowns=args.breakdown,
         )
 
 
+def output_path(args: argparse.Namespace, message: Any) -> Optional[str]:
+    """
+    The file or directory written by a command, if any.
+    """
+    if message is None:
+        return None
+    if args.command == const.DOWNLOAD and args.data_source == const.SOURCE__DVC:
+        return message
+    if args.command == const.DOWNLOAD:
+        return message[0]
+    if args.command == const.SYNC:
+        return message
+    return None
+
+
+def write_metrics(args: argparse.Namespace, message: Any, elapsed: float, error: Optional[str]):
+    output = output_path(args, message)
+    if output is not None and os.path.exists(output):
+        metrics.count(const.METRIC__BYTES_WRITTEN, disk_usage(output))
+    metrics.write(
+        args.metrics_out,
+        command=args.command,
+        data_source=getattr(args, "data_source", None),
+        output=output,
+        seconds=round(elapsed, 6),
+        error=error,
+    )
+
+
+def write_profile(args: argparse.Namespace, message: Any, profiler: Any):
+    # Commands without an output file profile next to their input, or in
+    # the working directory. So do downloads served from or put in the cache,
+    # its entries are shared and evicted as a whole.
+    output = output_path(args, message) or getattr(args, "input", None)
+    if output is not None and getattr(args, "cache", False):
+        cache_dir = os.path.realpath(os.path.expanduser(args.cache_dir))
+        if os.path.commonpath([cache_dir, os.path.realpath(output)]) == cache_dir:
+            output = os.path.basename(output)
+    if output is None:
+        output = f"skit-labels-{args.command}-{datetime.now():%Y%m%d-%H%M%S}"
+    for path in profiler.write(os.path.normpath(output)):
+        print(f"Profile written to {path}", file=sys.stderr)
+
+
 def main():
     parser = build_cli()
     args = parser.parse_args()
-    message = cmd_to_str(args)
+    metrics.reset()
+    profile = getattr(args, "profile", None)
+    profiler = profiling.PROFILERS[profile]() if profile else None
+    start = time.perf_counter()
+    message, error = None, None
+    try:
+        with profiler.running() if profiler else nullcontext():
+            message = cmd_to_str(args)
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        if getattr(args, "metrics_out", None):
+            write_metrics(args, message, time.perf_counter() - start, error)
+        if profiler:
+            write_profile(args, message, profiler)
     if args.command == const.DOWNLOAD and args.data_source in [const.SOURCE__DB, const.SOURCE__LABELSTUDIO]:
         # Since the first element is the file, message[1] is the dataset type.
         print(message[0])
+        if getattr(args, "job_ids", None):
+            # or the summary of each job, kept off stdout which has the file.
+            print(commands.print_job_stats(message[1]), file=sys.stderr)
     elif args.command == const.STATS:
         print(commands.print_job_stats(message))
     else:
@@ -0,0 +1,80 @@
+"""
+JSON encoding and decoding used on the download and upload paths.
+
+orjson is used when it is installed (dvc brings it in on CPython), the
+standard library otherwise. Values which show up verbatim in our csv output
+(tags, conversation alternatives) are encoded with `dumps`, which always
+matches `json.dumps`. Everything that is only read back by a json parser
+(sqlite `data`, request bodies) can use the faster `dumps_compact`. Install
+the `orjson` extra to get it where dvc doesn't.
+"""
+import json
+import math
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+_encoders = {
+    True: json.JSONEncoder(),
+    False: json.JSONEncoder(ensure_ascii=False),
+}
+_compact_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Decode json. Input the fast backend rejects (NaN, integers over 64 bits,
+    non-string input) goes through `json.loads`, which also raises the same
+    errors as before.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except (orjson.JSONDecodeError, TypeError):
+            pass
+    return json.loads(data)
+
+
+def dumps(value: Any, ensure_ascii: bool = True) -> str:
+    """
+    Same output as `json.dumps(value, ensure_ascii=ensure_ascii)`.
+    """
+    return _encoders[ensure_ascii].encode(value)
+
+
+def _has_non_finite(value: Any) -> bool:
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+def dumps_compact(value: Any) -> str:
+    """
+    Encode without whitespace or escaping non-ascii characters.
+
+    orjson writes NaN and infinities as null, values holding them are encoded
+    with the standard library which writes NaN and Infinity like it always
+    has. Only output with a null in it needs the check.
+    """
+    if orjson is not None:
+        try:
+            encoded = orjson.dumps(value)
+        except TypeError:
+            pass
+        else:
+            if b"null" not in encoded or not _has_non_finite(value):
+                return encoded.decode()
+    return _compact_encoder.encode(value)
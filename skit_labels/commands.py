@@ -2,14 +2,19 @@ import ast
 import uuid
 import asyncio
 import ast
+import csv
 import json
 import os
+import queue
 import tempfile
-from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, nullcontext
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import aiofiles
 
 import aiohttp
-import attr
 import dvc.api
 import jsonschema
 import numpy as np
@@ -21,9 +26,24 @@ from tenacity import retry, wait_exponential, stop_after_attempt
 import time
 from tqdm import tqdm
 
+from skit_labels import codec
 from skit_labels import constants as const
-from skit_labels.db import Database, Job, LabelstudioJob, SqliteDatabase
+from skit_labels import metrics
+from skit_labels.cache import DatasetCache, as_json
+from skit_labels.db import Database, Job, LabelstudioJob, SqliteDatabase, encode_rows
 from skit_labels.labelstudio import annotations
+from skit_labels.utils import large_csv_fields
+from skit_labels.writers import (
+    WRITERS,
+    JSONLWriter,
+    ParquetWriter,
+    ShardedWriter,
+    shard_of,
+    shard_path,
+    write_manifest,
+)
+
+Writer = Union[SqliteDatabase, ParquetWriter, JSONLWriter, ShardedWriter]
 
 def batch_gen(source, n=100):
     """
@@ -42,6 +62,285 @@ def batch_gen(source, n=100):
         yield batch
 
 
+def split_id_range(
+    low: int, high: int, n: int
+) -> List[Tuple[int, int]]:
+    """
+    Split the inclusive id range [low, high] into at most n contiguous slices
+    of (after_id, until_id) where after_id is exclusive.
+    """
+    n = max(1, min(n, high - low + 1))
+    step = (high - low + 1) / n
+    bounds = [low - 1] + [low - 1 + round(step * i) for i in range(1, n)] + [high]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def run_stage(
+    producers: List[Callable[[], Iterator]], workers: int = 1, maxsize: int = 2
+) -> Iterator:
+    """
+    Run each producer on a pool of `workers` threads and yield their items as
+    they come. The queue between the threads and the caller holds at most
+    `maxsize` items so producers wait for a slow consumer instead of piling
+    up batches. Exceptions in producers are raised in the caller.
+    """
+    items: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def work(producer):
+        iterator = producer()
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    break
+                items.put(item)
+        except Exception as e:
+            items.put(e)
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+            items.put(done)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for producer in producers:
+            executor.submit(work, producer)
+
+        pending = len(producers)
+        try:
+            while pending:
+                item = items.get()
+                if item is done:
+                    pending -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            # Unblock any producer still waiting on a full queue.
+            stop.set()
+            while pending:
+                if items.get() is done:
+                    pending -= 1
+
+
+def run_async(producer: Callable[[], AsyncIterator]) -> Iterator:
+    """
+    Iterate over the async generator made by `producer` on an event loop of
+    its own. The loop only runs while the next item is awaited, so this is
+    meant to be a `run_stage` producer which pulls items ahead on its thread.
+    """
+    loop = asyncio.new_event_loop()
+    iterator = producer()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(iterator.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def fetch_jobs(
+    sources: List[Tuple[Union[Job, LabelstudioJob], str, List[Tuple[int, int, int]]]],
+    workers: int = 1,
+    copy: bool = False,
+    encode: bool = False,
+    engine: str = const.ENGINE__THREADS,
+    **kwargs,
+) -> Iterator[Tuple[str, Tuple[int, int], List[Tuple]]]:
+    """
+    Fetch (after_id, last_id, until_id) slices of one or more jobs, given as
+    (job, job_id, ranges). Each slice is paged from last_id onwards and yields
+    (job_id, (after_id, last id of the batch), rows) so the writer can
+    checkpoint it.
+
+    Fetching and building rows run as separate stages on their own threads,
+    so the database, the transform and the caller writing batches overlap.
+    Slices are fetched by `workers` threads each on its own pooled connection,
+    and batches come in whatever order workers finish them.
+
+    With `copy`, each slice is streamed with a single COPY. Raw dict tasks
+    then skip decoding and task building entirely. With `encode`, tasks and
+    tags are json encoded for `SqliteDatabase` in the transform stage too.
+
+    The asyncio `engine` fetches slices of tog jobs on one event loop
+    instead, with up to `workers` pages in flight on connections of their
+    own, so round trips to a remote database overlap without a thread each.
+    It can't COPY.
+    """
+    if workers < 1:
+        raise ValueError(f"Expected at least one worker, got {workers}.")
+    if engine not in const.ENGINES:
+        raise ValueError(f"Unknown engine {engine}, expected one of {const.ENGINES}.")
+    if engine == const.ENGINE__ASYNCIO and copy:
+        raise ValueError("COPY downloads can't use the asyncio engine.")
+    if engine == const.ENGINE__ASYNCIO and any(
+        not isinstance(job, Job) for job, _, _ in sources
+    ):
+        raise ValueError("The asyncio engine is only supported for tog jobs.")
+
+    def fetch(job, job_id, after_id, last_id, until_id):
+        pages = job.copy_rows if copy else job.iter_rows
+        for db_rows in pages(after_id=last_id, until_id=until_id, **kwargs):
+            yield job, job_id, (after_id, db_rows[-1][-1]), db_rows
+
+    async def afetch():
+        items = asyncio.Queue(maxsize=2 * workers)
+        slots = asyncio.Semaphore(workers)
+        done = object()
+
+        async def fetch(job, job_id, after_id, last_id, until_id):
+            try:
+                async with slots:
+                    pages = job.aiter_rows(after_id=last_id, until_id=until_id, **kwargs)
+                    async for db_rows in pages:
+                        await items.put((job, job_id, (after_id, db_rows[-1][-1]), db_rows))
+            except Exception as e:
+                await items.put(e)
+            # Not when cancelled, nothing takes items by then.
+            await items.put(done)
+
+        tasks = [
+            asyncio.ensure_future(fetch(job, job_id, *slice_))
+            for job, job_id, ranges in sources
+            for slice_ in ranges
+        ]
+        pending = len(tasks)
+        try:
+            while pending:
+                item = await items.get()
+                if item is done:
+                    pending -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def transform(job, job_id, db_rows):
+        with metrics.timed(const.METRIC__TRANSFORM):
+            if copy and job.task_type == const.TASK_TYPE__DICT:
+                rows = [
+                    (data_id, task_json, tag_json, is_gold, tagged_time, job_id)
+                    for task_json, tag_json, is_gold, tagged_time, data_id in db_rows
+                ]
+            else:
+                rows = job.build_rows(db_rows, job_id)
+        if not encode:
+            return rows
+        with metrics.timed(const.METRIC__ENCODE):
+            return encode_rows(rows)
+
+    def transformed():
+        if engine == const.ENGINE__ASYNCIO:
+            fetched = run_stage([partial(run_async, afetch)], maxsize=2 * workers)
+        else:
+            fetched = run_stage(
+                [
+                    partial(fetch, job, job_id, *slice_)
+                    for job, job_id, ranges in sources
+                    for slice_ in ranges
+                ],
+                workers=workers,
+                maxsize=2 * workers,
+            )
+        with closing(fetched):
+            for job, job_id, checkpoint, db_rows in fetched:
+                yield job_id, checkpoint, transform(job, job_id, db_rows)
+
+    yield from run_stage([transformed])
+
+
+def fetch_ranges(
+    job: Union[Job, LabelstudioJob],
+    job_id: str,
+    ranges: List[Tuple[int, int, int]],
+    workers: int = 1,
+    copy: bool = False,
+    encode: bool = False,
+    **kwargs,
+) -> Iterator[Tuple[Tuple[int, int], List[Tuple]]]:
+    """
+    `fetch_jobs` for a single job, yielding (checkpoint, rows).
+    """
+    batches = fetch_jobs(
+        [(job, job_id, ranges)], workers, copy=copy, encode=encode, **kwargs
+    )
+    with closing(batches):
+        for _, checkpoint, rows in batches:
+            yield checkpoint, rows
+
+
+def resume_ranges(
+    sdb: SqliteDatabase,
+    job: Union[Job, LabelstudioJob],
+    database: Database,
+    workers: int,
+    metadata: Dict[str, Any],
+) -> List[Tuple[int, int, int]]:
+    """
+    Return the id slices left to download into `sdb`. A new file records
+    `metadata` and splits the job into `workers` slices, a file holding an
+    earlier download must have been started with the same `metadata`. Options
+    set on only one of the two, like a sample fraction, count as different.
+    """
+    stored = sdb.get_metadata()
+    if stored:
+        metadata = as_json(metadata)
+        keys = (stored.keys() | metadata.keys()) - {"synced_at"}
+        if any(stored.get(key) != metadata.get(key) for key in keys):
+            raise ValueError(f"{sdb.filepath} was downloaded with different arguments: {stored}")
+        sdb.verify()
+        logger.info(f"Resuming download of {sdb.count()} rows into {sdb.filepath}")
+    elif sdb.count():
+        raise ValueError(f"{sdb.filepath} has data but no checkpoints to resume from.")
+    else:
+        # Rows changed after this point are picked up by `sync_dataset`.
+        metadata = {**metadata, "synced_at": database.now()}
+        low, high = job.id_range(
+            untagged=metadata["full"],
+            start_date=metadata["start_date"],
+            end_date=metadata["end_date"],
+        )
+        ranges = [] if low is None else split_id_range(low, high, workers)
+        sdb.start_download(metadata, ranges)
+    return sdb.pending_ranges()
+
+
+def tog_job_options(
+    db: Optional[str] = None,
+    sample_fraction: Optional[float] = None,
+    stratify_by: Optional[str] = None,
+    filters: Optional[Dict[str, List[str]]] = None,
+    fields: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Keyword arguments for `Job` which labelstudio jobs don't support, only
+    those which are set. Empty filters and fields are the same as none, a
+    sample fraction of 0 is passed on for `Job` to reject.
+    """
+    options = {
+        key: value
+        for key, value in [
+            ("sample_fraction", sample_fraction),
+            ("stratify_by", stratify_by),
+            ("filters", filters or None),
+            ("fields", fields or None),
+        ]
+        if value is not None
+    }
+    if options and db == const.LABELSTUIO_DB:
+        raise ValueError(f"{', '.join(options)} are only supported for tog jobs.")
+    return options
+
+
 def download_dataset(
     job_id: str,
     task_type: str,
@@ -55,8 +354,47 @@ def download_dataset(
     password: Optional[str] = None,
     host: Optional[str] = None,
     port: Optional[Union[int, str]] = None,
-) -> Tuple[SqliteDatabase, str, str]:
-    database = Database(db=db, user=user, password=password, host=host, port=port)
+    workers: int = 1,
+    resume: Optional[str] = None,
+    copy: bool = False,
+    engine: str = const.ENGINE__THREADS,
+    writer: Optional[Writer] = None,
+    sample_fraction: Optional[float] = None,
+    stratify_by: Optional[str] = None,
+    filters: Optional[Dict[str, List[str]]] = None,
+    fields: Optional[List[str]] = None,
+) -> Tuple[Writer, str, str]:
+    """
+    Download a job into a sqlite file. Every batch is checkpointed, passing
+    the same file as `resume` continues an interrupted download of it.
+
+    `copy` fetches rows with COPY instead of paging a cursor, this is fastest
+    for `dict` tasks which are stored without any transformation.
+    `engine` picks how pages are fetched, see `fetch_jobs`.
+
+    Batches go to `writer` instead when it is given. Such downloads aren't
+    checkpointed and can't be resumed.
+
+    `sample_fraction` downloads only that fraction of the job, picked in the
+    database by a hash of the data id, `stratify_by` takes it from every tag.
+    `filters` keep rows matching them in the database and `fields` only
+    these keys of the task data, see `Job`.
+    """
+    if copy and db == const.LABELSTUIO_DB:
+        raise ValueError("COPY downloads are only supported for tog jobs.")
+    if engine == const.ENGINE__ASYNCIO and db == const.LABELSTUIO_DB:
+        raise ValueError("The asyncio engine is only supported for tog jobs.")
+    options = tog_job_options(db, sample_fraction, stratify_by, filters, fields)
+    if resume and writer is not None:
+        raise ValueError("Only sqlite downloads can be resumed.")
+    database = Database(
+        db=db,
+        user=user,
+        password=password,
+        host=host,
+        port=port,
+        pool_size=max(const.DB_POOL_SIZE, workers + 1),
+    )
     JOB_CREATOR = LabelstudioJob if db == const.LABELSTUIO_DB else Job
     job = JOB_CREATOR(
         int(job_id),
@@ -69,45 +407,280 @@ def download_dataset(
         user=user,
         password=password,
         host=host,
-        port=port
+        port=port,
+        **options,
     )
+    # Asked before streaming, so the metadata queries are over before a long
+    # download starts.
+    dataset_type = job.type()
     if db != const.LABELSTUIO_DB:
         describe_dataset(job_id, job=job)
-        stat_dataset(job_id, job=job)
+        stats = stat_dataset(job_id, job=job)
+        total = stats[const.TOTAL if full else const.TAGGED]
+    else:
+        total = job.total(untagged=full)
 
-    _, temp_filepath = tempfile.mkstemp(suffix=const.OUTPUT_FORMAT__SQLITE)
-    sdb = SqliteDatabase(temp_filepath)
-    bar = tqdm(total=job.total(untagged=full))
-    data_ids = job.get_ids(untagged=full, start_date=start_date, end_date=end_date)
-    
-    for start_index in range(0, len(data_ids), batch_size):
-        items = job.get(data_ids=data_ids[start_index:start_index+batch_size], untagged=full, start_date=start_date, end_date=end_date)
-        rows = []
-        for task, tag, tagged_time in items:
-            # For raw dictionary type tasks, we don't use attr classes.
-            task_dict = task if isinstance(task, dict) else attr.asdict(task)
-
-            # TODO: is_gold might not be working for dict type tasks as of now
-            rows.append(
-                (
-                    task.id,
-                    task_dict,
-                    tag,
-                    task.is_gold,
-                    tagged_time,
-                    job_id
-                )
+    if writer is None:
+        sdb_path = resume or tempfile.mkstemp(suffix=const.OUTPUT_FORMAT__SQLITE)[1]
+        writer = SqliteDatabase(sdb_path)
+        ranges = resume_ranges(
+            writer,
+            job,
+            database,
+            workers,
+            {
+                "job_id": job_id,
+                "task_type": task_type,
+                "timezone": timezone,
+                "full": full,
+                "start_date": start_date,
+                "end_date": end_date,
+                "db": db,
+                **options,
+            },
+        )
+        done = writer.count()
+    else:
+        low, high = job.id_range(untagged=full, start_date=start_date, end_date=end_date)
+        ranges = [] if low is None else [
+            (after_id, after_id, until_id)
+            for after_id, until_id in split_id_range(low, high, workers)
+        ]
+        done = 0
+
+    bar = tqdm(total=total, initial=done)
+    batches = fetch_ranges(
+        job,
+        job_id,
+        ranges,
+        workers,
+        copy=copy,
+        engine=engine,
+        encode=isinstance(writer, SqliteDatabase),
+        untagged=full,
+        batch_size=batch_size,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+    load = writer.bulk_load() if isinstance(writer, SqliteDatabase) else nullcontext()
+    with load, closing(batches):
+        for checkpoint, rows in batches:
+            with metrics.timed(const.METRIC__WRITE):
+                writer.insert_rows(rows, checkpoint=checkpoint)
+            metrics.count(const.METRIC__ROWS_WRITTEN, len(rows))
+            bar.update(n=len(rows))
+
+    database.close()
+    return writer, writer.filepath, dataset_type
+
+
+def download_datasets(
+    job_ids: List[str],
+    task_type: str,
+    timezone: pytz.BaseTzInfo = pytz.UTC,
+    full: bool = False,
+    batch_size: int = 500,
+    output_format: str = const.OUTPUT_FORMAT__SQLITE,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: Optional[str] = None,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+    host: Optional[str] = None,
+    port: Optional[Union[int, str]] = None,
+    workers: int = 1,
+    copy: bool = False,
+    engine: str = const.ENGINE__THREADS,
+    sample_fraction: Optional[float] = None,
+    stratify_by: Optional[str] = None,
+    filters: Optional[Dict[str, List[str]]] = None,
+    fields: Optional[List[str]] = None,
+) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+    """
+    Download several tog jobs into one file, rows of each job are told apart
+    by their `job_id` column. Jobs share one connection pool and their id
+    slices are fetched concurrently by `workers` threads.
+
+    Returns the file and a summary of each job: name, type and rows written.
+    Sqlite files are indexed on job_id but can't be resumed or synced.
+    """
+    if output_format not in WRITERS and output_format != const.OUTPUT_FORMAT__SQLITE:
+        raise ValueError(
+            f"Multiple jobs can't be downloaded as {output_format}, use one of {[const.OUTPUT_FORMAT__SQLITE, *WRITERS]}."
+        )
+    if db == const.LABELSTUIO_DB:
+        raise ValueError("Multiple jobs can only be downloaded from tog, not labelstudio.")
+    job_ids = list(dict.fromkeys(job_ids))
+    database = Database(
+        db=db,
+        user=user,
+        password=password,
+        host=host,
+        port=port,
+        pool_size=max(const.DB_POOL_SIZE, workers + 1),
+    )
+    jobs = {
+        job_id: Job(
+            int(job_id),
+            task_type=task_type,
+            tz=timezone,
+            start_date=start_date,
+            end_date=end_date,
+            database=database,
+            sample_fraction=sample_fraction,
+            stratify_by=stratify_by,
+            filters=filters,
+            fields=fields,
+        )
+        for job_id in job_ids
+    }
+
+    _, output_file = tempfile.mkstemp(prefix="jobs-", suffix=output_format)
+    if output_format in WRITERS:
+        writer = WRITERS[output_format](output_file)
+        load = nullcontext()
+    else:
+        writer = SqliteDatabase(output_file)
+        writer.set_metadata(
+            as_json(
+                {
+                    "job_ids": job_ids,
+                    "task_type": task_type,
+                    "timezone": timezone,
+                    "full": full,
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "db": db,
+                    "sample_fraction": sample_fraction,
+                    "stratify_by": stratify_by,
+                    "filters": filters,
+                    "fields": fields,
+                }
             )
+        )
+        load = writer.bulk_load(by_job=True)
+
+    sources = []
+    total = 0
+    types = {}
+    for job_id, job in jobs.items():
+        types[job_id] = job.type()
+        total += stat_dataset(job=job)[const.TOTAL if full else const.TAGGED]
+        low, high = job.id_range(untagged=full)
+        if low is not None:
+            ranges = [
+                (after_id, after_id, until_id)
+                for after_id, until_id in split_id_range(low, high, workers)
+            ]
+            sources.append((job, job_id, ranges))
 
-        sdb.insert_rows(rows)
-        bar.update(n=len(items))
-    return sdb, temp_filepath, job.type()
+    bar = tqdm(total=total)
+    batches = fetch_jobs(
+        sources,
+        workers,
+        copy=copy,
+        engine=engine,
+        encode=isinstance(writer, SqliteDatabase),
+        untagged=full,
+        batch_size=batch_size,
+    )
+    written = dict.fromkeys(job_ids, 0)
+    with load, closing(batches):
+        for job_id, _, rows in batches:
+            with metrics.timed(const.METRIC__WRITE):
+                writer.insert_rows(rows)
+            metrics.count(const.METRIC__ROWS_WRITTEN, len(rows))
+            written[job_id] += len(rows)
+            bar.update(n=len(rows))
+    bar.close()
+    writer.close()
+
+    summary = {
+        job_id: {"name": job.name, "type": types[job_id], "rows": written[job_id]}
+        for job_id, job in jobs.items()
+    }
+    database.close()
+    return output_file, summary
+
+
+def sync_dataset(
+    input_file: str,
+    job_id: Optional[str] = None,
+    task_type: Optional[str] = None,
+    timezone: Optional[pytz.BaseTzInfo] = None,
+    batch_size: int = 500,
+    db: Optional[str] = None,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+    host: Optional[str] = None,
+    port: Optional[Union[int, str]] = None,
+) -> str:
+    """
+    Bring a sqlite file from `download_dataset_from_db` up to date by fetching
+    only rows added or tagged after its last sync and upserting them by data_id.
+
+    Arguments not given are read from the file. Files without sync metadata
+    use their latest tagged_time as the high-water mark.
+    """
+    sdb = SqliteDatabase(input_file)
+    if sdb.pending_ranges():
+        raise ValueError(f"{input_file} is only partly downloaded, finish it with --resume before syncing.")
+    metadata = sdb.get_metadata()
+    job_id = job_id or metadata.get("job_id")
+    if job_id is None:
+        raise ValueError(f"{input_file} doesn't record its job id, pass it explicitly.")
+    task_type = task_type or metadata.get("task_type", const.TASK_TYPE__CONVERSATION)
+    timezone = timezone or pytz.timezone(metadata.get("timezone", "UTC"))
+    full = metadata.get("full", False)
+    since = metadata.get("synced_at") or sdb.high_water_mark()
+
+    database = Database(db=db, user=user, password=password, host=host, port=port)
+    synced_at = database.now()
+    job = Job(
+        int(job_id),
+        task_type=task_type,
+        tz=timezone,
+        start_date=metadata.get("start_date"),
+        end_date=metadata.get("end_date"),
+        database=database,
+        sample_fraction=metadata.get("sample_fraction"),
+        stratify_by=metadata.get("stratify_by"),
+        filters=metadata.get("filters"),
+        fields=metadata.get("fields"),
+    )
+
+    n_rows = 0
+    with sdb.bulk_load():
+        for db_rows in job.iter_rows(untagged=full, batch_size=batch_size, since=since):
+            with metrics.timed(const.METRIC__TRANSFORM):
+                rows = job.build_rows(db_rows, job_id)
+            with metrics.timed(const.METRIC__WRITE):
+                sdb.upsert_rows(rows)
+            metrics.count(const.METRIC__ROWS_WRITTEN, len(rows))
+            n_rows += len(db_rows)
+    # Upserts aren't download batches, account for them so --resume still
+    # finds the file complete.
+    sdb.mark_complete()
+
+    sdb.set_metadata(
+        {
+            "job_id": job_id,
+            "task_type": task_type,
+            "timezone": timezone,
+            "full": full,
+            "synced_at": synced_at,
+        }
+    )
+    database.close()
+    logger.info(f"Synced {n_rows} rows changed since {since} into {input_file}")
+    return input_file
 
 
 def parse_json(data: str) -> Dict[str, Any]:
     try:
-        data = json.loads(data)
-        data = data if isinstance(data, dict) else json.loads(data)
+        data = codec.loads(data)
+        data = data if isinstance(data, dict) else codec.loads(data)
         return data
     except JSONDecodeError:
         return {}
@@ -122,14 +695,140 @@ def unpack(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def sdb2df(sdb: SqliteDatabase, job_id: str) -> str:
-    _, output_file = tempfile.mkstemp(
-        prefix=f"job-{job_id}-", suffix=const.OUTPUT_FORMAT__CSV
-    )
-    df = pd.read_sql_query("SELECT * FROM data", sdb.conn)
-    df = unpack(df)
-    df.to_csv(output_file, index=False)
-    return output_file
+def _flatten(value: Any, key: str, record: Dict[str, Any]):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(v, f"{key}.{k}", record)
+    else:
+        record[key] = value
+
+
+def flatten_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flatten nested dicts to dotted keys, with the same key order as `pd.json_normalize`.
+    """
+    flat = {key: value for key, value in record.items() if not isinstance(value, dict)}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            _flatten(value, key, flat)
+    return flat
+
+
+def iter_records(sdb: SqliteDatabase, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    cur = sdb.conn.execute("SELECT * FROM data")
+    names = [column[0] for column in cur.description]
+    while rows := cur.fetchmany(chunk_size):
+        records = []
+        for row in rows:
+            record = dict(zip(names, row))
+            record["data"] = parse_json(record["data"])
+            records.append(flatten_record(record))
+        yield records
+
+
+def common_dtype(dtypes: set) -> Any:
+    if len(dtypes) == 1:
+        return dtypes.pop()
+    if dtypes <= {np.dtype("int64"), np.dtype("float64")}:
+        return np.dtype("float64")
+    return np.dtype("O")
+
+
+def csv_schema(sdb: SqliteDatabase, chunk_size: int) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Columns and dtypes that `unpack` would give the whole `data` table, computed
+    a chunk at a time. A column absent or all null in a chunk holds NaN there.
+    """
+    columns: Dict[str, None] = {}
+    dtypes: Dict[str, set] = {}
+    n_rows = 0
+    chunk_columns = []
+    for records in iter_records(sdb, chunk_size):
+        n_rows += len(records)
+        frame = pd.DataFrame(records)
+        columns.update(dict.fromkeys(frame.columns))
+        present = set()
+        for column in frame.columns:
+            if frame[column].isna().all():
+                continue
+            present.add(column)
+            dtypes.setdefault(column, set()).add(frame[column].dtype)
+        chunk_columns.append(present)
+
+    for column in columns:
+        if any(column not in present for present in chunk_columns):
+            dtypes.setdefault(column, set()).add(np.dtype("float64"))
+    return list(columns), {column: common_dtype(dtypes[column]) for column in columns}
+
+
+def count_csv_rows(path: str) -> int:
+    with open(path, newline="") as f, large_csv_fields():
+        return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+
+def sdb2df(
+    sdb: SqliteDatabase,
+    job_id: str,
+    chunk_size: int = const.CSV_CHUNK_SIZE,
+    shards: int = 1,
+    postprocess: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Convert the sqlite dataset to csv in chunks of `chunk_size` rows.
+
+    The first pass over the table finds the columns and their dtypes, the
+    second writes each chunk with them. The csv is the same as `unpack` over
+    the whole table, but memory is bounded by the chunk size.
+
+    With more than one shard, rows are split by `shard_of` their data_id into
+    csv files with the same header in a directory, which is returned.
+    `postprocess` is called with each csv file once it is complete.
+    """
+    if shards > 1:
+        output_dir = tempfile.mkdtemp(prefix=f"job-{job_id}-")
+        paths = [
+            shard_path(output_dir, shard, shards, const.OUTPUT_FORMAT__CSV)
+            for shard in range(shards)
+        ]
+    else:
+        _, output_file = tempfile.mkstemp(
+            prefix=f"job-{job_id}-", suffix=const.OUTPUT_FORMAT__CSV
+        )
+        paths = [output_file]
+    rows = [0] * len(paths)
+
+    columns, dtypes = csv_schema(sdb, chunk_size)
+    header = [
+        col.replace("data.", "") if col.startswith("data.") and "data_id" not in col else col
+        for col in columns
+    ]
+    casts = {column: dtype for column, dtype in dtypes.items() if dtype != np.dtype("O")}
+    for records in iter_records(sdb, chunk_size) if columns else []:
+        df = pd.DataFrame(records, columns=columns, dtype=object).astype(casts)
+        if shards > 1:
+            parts = df.groupby(df["data_id"].map(lambda data_id: shard_of(data_id, shards)))
+        else:
+            parts = [(0, df)]
+        for shard, part in parts:
+            part.to_csv(
+                paths[shard],
+                index=False,
+                header=header if not rows[shard] else False,
+                mode="a" if rows[shard] else "w",
+            )
+            rows[shard] += len(part)
+
+    for shard, path in enumerate(paths):
+        if not rows[shard]:
+            pd.DataFrame(columns=header or None).to_csv(path, index=False)
+        if postprocess is not None:
+            postprocess(path)
+            # It may drop rows, count what is left for the manifest.
+            rows[shard] = count_csv_rows(path)
+    if shards > 1:
+        write_manifest(output_dir, paths, rows)
+        return output_dir
+    return paths[0]
 
 
 def describe_dataset(
@@ -161,7 +860,12 @@ def stat_dataset(
     password: Optional[str] = None,
     host: Optional[str] = None,
     port: Optional[Union[int, str]] = None,
+    breakdowns: Optional[List[str]] = None,
 ) -> dict:
+    """
+    Total, tagged and untagged counts of a job, with `breakdowns` from
+    `const.STATS_BREAKDOWNS` also gold counts and counts per tag or day.
+    """
     job_ = job or Job(
         int(job_id),
         start_date=start_date,
@@ -172,13 +876,7 @@ def stat_dataset(
         host=host,
         port=port,
     )
-    n_total = job_.total(untagged=True)
-    n_tagged = job_.total()
-    return {
-        const.TOTAL: n_total,
-        const.TAGGED: n_tagged,
-        const.UNTAGGED: n_total - n_tagged,
-    }
+    return job_.stats(breakdowns=breakdowns or ())
 
 
 def print_job_stats(job_stats: dict) -> str:
@@ -196,16 +894,20 @@ def download_dataset_from_dvc(
     return output_file
 
 
+def labelstudio_alternatives(value: str) -> str:
+    alternatives = codec.loads(value)
+    if not alternatives:
+        return codec.dumps([])
+    return codec.dumps(codec.loads(alternatives), ensure_ascii=False)
+
+
 def processLabelstudioColumns(df_path: str):
     df = pd.read_csv(df_path)
     df[const.DATA_ID] = df[const.CONVERSATION_UUID].values
     df[const.ALTERNATIVES] = df[const.UTTERANCES].values if const.UTTERANCES in df else df[const.ALTERNATIVES]
-    df[const.ALTERNATIVES] = df[const.ALTERNATIVES].apply(
-        lambda val: json.dumps(json.loads(json.loads(val)), ensure_ascii=False) \
-            if json.loads(val) else json.dumps([])
-    )
+    df[const.ALTERNATIVES] = df[const.ALTERNATIVES].apply(labelstudio_alternatives)
 
-    df["labelstudio_raw_tag"] = df["tag"].apply(json.loads)
+    df["labelstudio_raw_tag"] = df["tag"].apply(codec.loads)
     df["tag"] = df["labelstudio_raw_tag"].apply(annotations.extract_annotation_related_to_intents, args=(const.FROM_NAME_INTENT, const.FROM_NAME_INTENT))
     df["incorrect_transcript"] = df["labelstudio_raw_tag"].apply(annotations.extract_annotation_related_to_intents, args=(const.FROM_NAME_GOLD_DATA, const.INCORRECT_TRANSCRIPT))
     df["gold_ready_for_training"] = df["labelstudio_raw_tag"].apply(annotations.extract_annotation_related_to_intents, args=(const.FROM_NAME_GOLD_DATA, const.GOLD_READY_FOR_TRAINING))
@@ -216,7 +918,7 @@ def processLabelstudioColumns(df_path: str):
 async def download_dataset_from_labelstudio(
     url: str,
     token: str,
-    project_id: Union[int, str]
+    project_id: Union[int, str],
 ) -> Tuple[str, str]:
     """
     Download dataset from labelstudio
@@ -226,14 +928,18 @@ async def download_dataset_from_labelstudio(
         "Authorization": f"token {token}",
     }
     async with aiohttp.ClientSession(url, headers=headers) as session:
-        async with session.get(url=f"/api/projects/{project_id}/export?exportType=CSV") as response:
-            if response.status != 200:
-                error_message = await response.text()
-                raise Exception(f"Error downloading dataset: {error_message} {response.status} ")
-            async with aiofiles.open(output_file, mode='wb') as f:
-                await f.write(await response.read())
-    
-    processLabelstudioColumns(df_path=output_file)
+        with metrics.timed(const.METRIC__REQUEST):
+            async with session.get(url=f"/api/projects/{project_id}/export?exportType=CSV") as response:
+                if response.status != 200:
+                    error_message = await response.text()
+                    raise Exception(f"Error downloading dataset: {error_message} {response.status} ")
+                body = await response.read()
+        metrics.count(const.METRIC__BYTES_FETCHED, len(body))
+        async with aiofiles.open(output_file, mode='wb') as f:
+            await f.write(body)
+
+    with metrics.timed(const.METRIC__CONVERT):
+        processLabelstudioColumns(df_path=output_file)
     return output_file, "csv"
 
 
@@ -251,7 +957,101 @@ def download_dataset_from_db(
     password: Optional[str] = None,
     host: Optional[str] = None,
     port: Optional[Union[int, str]] = None,
+    workers: int = 1,
+    resume: Optional[str] = None,
+    copy: bool = False,
+    engine: str = const.ENGINE__THREADS,
+    cache: Optional[DatasetCache] = None,
+    shards: int = 1,
+    sample_fraction: Optional[float] = None,
+    stratify_by: Optional[str] = None,
+    filters: Optional[Dict[str, List[str]]] = None,
+    fields: Optional[List[str]] = None,
 ) -> Tuple[str, str]:
+    """
+    Download a job as `output_format`, returning the file and dataset type.
+
+    With more than one shard, the file is a directory of `shards` files which
+    rows are spread over by a stable hash of data_id, and a manifest of their
+    row counts and checksums.
+
+    With `cache`, a download with the same arguments is served from it while
+    the job's row count and latest tagged_time are unchanged. New downloads
+    are moved into the cache.
+    """
+    if cache is not None and resume is None:
+        key = cache.key(
+            source=const.SOURCE__DB,
+            job_id=str(job_id),
+            task_type=task_type,
+            timezone=timezone,
+            full=full,
+            output_format=output_format,
+            start_date=start_date,
+            end_date=end_date,
+            db=db,
+            host=host,
+            port=port,
+            shards=shards,
+            sample_fraction=sample_fraction,
+            stratify_by=stratify_by,
+            filters=filters,
+            fields=fields,
+        )
+        database = Database(db=db, user=user, password=password, host=host, port=port)
+        JOB_CREATOR = LabelstudioJob if db == const.LABELSTUIO_DB else Job
+        try:
+            fingerprint = JOB_CREATOR(
+                int(job_id),
+                task_type=task_type,
+                start_date=start_date,
+                end_date=end_date,
+                database=database,
+                **tog_job_options(db, sample_fraction, stratify_by, filters, fields),
+            ).fingerprint(untagged=full)
+        finally:
+            database.close()
+        cached = cache.get(key, fingerprint)
+        if cached is not None:
+            return cached
+        output_file, dataset_type = download_dataset_from_db(
+            job_id,
+            task_type,
+            timezone,
+            full,
+            batch_size,
+            output_format,
+            start_date,
+            end_date,
+            db=db,
+            user=user,
+            password=password,
+            host=host,
+            port=port,
+            workers=workers,
+            copy=copy,
+            engine=engine,
+            shards=shards,
+            sample_fraction=sample_fraction,
+            stratify_by=stratify_by,
+            filters=filters,
+            fields=fields,
+        )
+        return cache.put(key, fingerprint, output_file, dataset_type)
+
+    if shards < 1:
+        raise ValueError(f"Expected at least one shard, got {shards}.")
+    if shards > 1 and output_format == const.OUTPUT_FORMAT__SQLITE:
+        raise ValueError("Sqlite downloads can't be sharded.")
+    writer = None
+    if output_format in WRITERS and shards > 1:
+        writer = ShardedWriter(
+            tempfile.mkdtemp(prefix=f"job-{job_id}-"), output_format, shards
+        )
+    elif output_format in WRITERS:
+        _, output_file = tempfile.mkstemp(prefix=f"job-{job_id}-", suffix=output_format)
+        writer = WRITERS[output_format](output_file)
+
     sdb, sdb_path, dataset_type = download_dataset(
         job_id,
         task_type,
@@ -265,12 +1065,29 @@ def download_dataset_from_db(
         password=password,
         host=host,
         port=port,
+        workers=workers,
+        resume=resume,
+        copy=copy,
+        engine=engine,
+        writer=writer,
+        sample_fraction=sample_fraction,
+        stratify_by=stratify_by,
+        filters=filters,
+        fields=fields,
     )
-    if output_format == const.OUTPUT_FORMAT__CSV:
-        df_path = sdb2df(sdb, job_id)
-        if db == const.LABELSTUIO_DB:
-            processLabelstudioColumns(df_path)
-        os.remove(sdb_path)
+    if output_format in WRITERS:
+        sdb.close()
+        return sdb_path, dataset_type
+    elif output_format == const.OUTPUT_FORMAT__CSV:
+        with metrics.timed(const.METRIC__CONVERT):
+            df_path = sdb2df(
+                sdb,
+                job_id,
+                shards=shards,
+                postprocess=processLabelstudioColumns if db == const.LABELSTUIO_DB else None,
+            )
+        if not resume:
+            os.remove(sdb_path)
         return df_path, dataset_type
     else:
         return sdb_path, dataset_type
@@ -281,7 +1098,7 @@ def extract_utterances_safely(conversation_uuid, utterances):
         return []
     try:
         utterances = (
-            json.loads(utterances) if isinstance(utterances, str) else utterances
+            codec.loads(utterances) if isinstance(utterances, str) else utterances
         )
     except json.JSONDecodeError:
         utterances = ast.literal_eval(utterances) if isinstance(utterances, str) else []
@@ -323,7 +1140,7 @@ def build_dataset(
         dedupe_id = f"{conversation_uuid}_{uuid.uuid4().hex}"
         errors = []
         if const.RAW in data_frame.columns:
-            data = json.loads(row[const.RAW])
+            data = codec.loads(row[const.RAW])
         else:
             data = row.to_dict()
         utterance_columns = {const.UTTERANCES, const.ALTERNATIVES}
@@ -364,16 +1181,20 @@ async def upload_dataset(
         path = f"/tog/tasks/?job_id={job_id}"
         status_code = 0
         try:
-            async with session.post(path, json=dataset) as response:
-                status_code = response.status
-                if str(response.status).startswith("2"):
-                    upload_response = await response.json()
-                    return (upload_response, status_code)
-                else:
-                    raise aiohttp.ClientOSError
+            with metrics.timed(const.METRIC__REQUEST):
+                async with session.post(path, json=dataset) as response:
+                    status_code = response.status
+                    if str(response.status).startswith("2"):
+                        upload_response = await response.json(loads=codec.loads)
+                        metrics.count(const.METRIC__ROWS_WRITTEN, len(dataset))
+                        return (upload_response, status_code)
+                    else:
+                        raise aiohttp.ClientOSError
                 
         except (aiohttp.ClientOSError, aiohttp.ServerDisconnectedError, asyncio.TimeoutError) as e:
             retries -= 1
+            if retries >= 0:
+                metrics.count(const.METRIC__RETRIES)
             print(f"failed to upload dataset: {e},\n..retrying in {sleep_time} seconds")
             await asyncio.sleep(sleep_time)
     
@@ -397,7 +1218,9 @@ async def upload_dataset_batches(
     """
     headers = {"Authorization": f"Bearer {token}"}
     print("Uploading batches")
-    async with aiohttp.ClientSession(url, headers=headers) as session:
+    async with aiohttp.ClientSession(
+        url, headers=headers, json_serialize=codec.dumps_compact
+    ) as session:
         requests = [
             upload_dataset(session, job_id, dataset) for dataset in dataset_chunks
         ]
@@ -413,7 +1236,11 @@ async def upload_file(input_file: str, project_id: str, session: aiohttp.ClientS
         return await session.post(f"/api/projects/{project_id}/import", data={"file": f})
 
 
-@retry(stop=stop_after_attempt(4), wait=wait_exponential(multiplier=60*2, min=60*2, max=60*15))
+@retry(
+    stop=stop_after_attempt(4),
+    wait=wait_exponential(multiplier=60*2, min=60*2, max=60*15),
+    before_sleep=lambda _: metrics.count(const.METRIC__RETRIES),
+)
 async def upload_dataset_to_labelstudio(
     input_file: str,
     url: str,
@@ -429,7 +1256,8 @@ async def upload_dataset_to_labelstudio(
     headers = {"Authorization": f"token {token}"}
     async with aiohttp.ClientSession(url, headers=headers) as session:
         start_time = time.time()
-        response = await upload_file(input_file, project_id, session)
+        with metrics.timed(const.METRIC__REQUEST):
+            response = await upload_file(input_file, project_id, session)
         logger.info("Time taken for uploading dataset: " + "%.2f" % (time.time() - start_time) + " seconds")
 
         if response.status != 201:
@@ -438,6 +1266,7 @@ async def upload_dataset_to_labelstudio(
             raise RuntimeError(f"Failed to upload dataset to LabelStudio: {error_message}, {response.status}")
         else:
             response = await response.json()
+            metrics.count(const.METRIC__ROWS_WRITTEN, response["task_count"])
             return [], response["task_count"]
 
 
@@ -464,7 +1293,8 @@ async def upload_dataset_to_db(
         raise ValueError("Expected file extension to be a csv.")
 
     data_frame = pd.read_csv(input_file)
-    dataset = build_dataset(job_id, data_frame)
+    with metrics.timed(const.METRIC__TRANSFORM):
+        dataset = build_dataset(job_id, data_frame)
     batched_datasets = batch_gen(dataset, 100)
     errors_final = []
     for batched_dataset in batch_gen(batched_datasets, 10):
@@ -39,9 +39,25 @@ DOWNLOAD = "download"
 UPLOAD = "upload"
 DESCRIBE = "describe"
 STATS = "stats"
+SYNC = "sync"
 
 OUTPUT_FORMAT__CSV = ".csv"
 OUTPUT_FORMAT__SQLITE = ".sqlite"
+OUTPUT_FORMAT__PARQUET = ".parquet"
+OUTPUT_FORMAT__JSONL = ".jsonl"
+OUTPUT_FORMAT__JSONL_GZ = ".jsonl.gz"
+OUTPUT_FORMAT__JSONL_ZST = ".jsonl.zst"
+OUTPUT_FORMATS = [
+    OUTPUT_FORMAT__CSV,
+    OUTPUT_FORMAT__SQLITE,
+    OUTPUT_FORMAT__PARQUET,
+    OUTPUT_FORMAT__JSONL,
+    OUTPUT_FORMAT__JSONL_GZ,
+    OUTPUT_FORMAT__JSONL_ZST,
+]
+SHARD_MANIFEST = "manifest.json"
+JSONL_GZIP_LEVEL = 6
+JSONL_ZSTD_LEVEL = 3
 
 SOURCE__DB = "tog"
 SOURCE__LABELSTUDIO = "labelstudio"
@@ -107,10 +123,60 @@ TOGDB_HOST = "TOGDB_HOST"
 TOGDB_PORT = "TOGDB_PORT"
 TOGDB_USER = "TOGDB_USER"
 TOGDB_PASSWORD = "TOGDB_PASS"
+DB_POOL_SIZE = 4
+# Batches read by each COPY of a `--copy` download, held in memory at once.
+COPY_PAGE_BATCHES = 10
+ENGINE__THREADS = "threads"
+ENGINE__ASYNCIO = "asyncio"
+ENGINES = [ENGINE__THREADS, ENGINE__ASYNCIO]
+
+# Phases and counters of `metrics`.
+METRIC__QUERY = "query"
+METRIC__TRANSFORM = "transform"
+METRIC__ENCODE = "encode"
+METRIC__WRITE = "write"
+METRIC__CONVERT = "convert"
+METRIC__REQUEST = "request"
+METRIC__ROWS_FETCHED = "rows_fetched"
+METRIC__BYTES_FETCHED = "bytes_fetched"
+METRIC__ROWS_WRITTEN = "rows_written"
+METRIC__BYTES_WRITTEN = "bytes_written"
+METRIC__RETRIES = "retries"
+
+# `profiling` kinds and the commands functions it reports on.
+PROFILE__CPU = "cpu"
+PROFILE__MEMORY = "memory"
+PROFILES = [PROFILE__CPU, PROFILE__MEMORY]
+PROFILE_TOP = 25
+PROFILE_STAGES = [
+    "download_dataset",
+    "download_datasets",
+    "sync_dataset",
+    "sdb2df",
+    "processLabelstudioColumns",
+    "build_dataset",
+]
+
+CSV_CHUNK_SIZE = 10000
+SQLITE_CACHE_SIZE_MB = 64
+SKIT_CACHE_DIR = "SKIT_CACHE_DIR"
+SKIT_CACHE_SIZE_MB = "SKIT_CACHE_SIZE_MB"
+CACHE_DIR = "~/.skit/cache"
+CACHE_SIZE_MB = 10240
 
 TOTAL = "total"
 TAGGED = "tagged"
 UNTAGGED = "untagged"
+GOLD = "gold"
+STATS__TAG = "tag"
+STATS__DAY = "day"
+STATS__GOLD = "gold"
+STATS_BREAKDOWNS = [STATS__TAG, STATS__DAY, STATS__GOLD]
+STATS_BREAKDOWN_KEYS = {STATS__TAG: "tags", STATS__DAY: "days"}
+STRATIFY__TAG = "tag"
+FILTER__TAG = "tag"
+FILTER__IS_GOLD = "is_gold"
+STRATIFY_BY = [STRATIFY__TAG]
 VALID_DATA_LABELS = ["Client", "Ops", "UAT", "Live"]
 
 INCORRECT_TRANSCRIPT = "Incorrect Transcript"
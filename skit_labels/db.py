@@ -2,19 +2,34 @@
 Module for working with tog database
 """
 
+import asyncio
+import csv
 import json
 import os
+import re
 import sqlite3
+import tempfile
+import threading
 import time
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Union
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 
+import attr
+import numpy as np
+import pandas as pd
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
 import pytz
 
-from skit_labels.utils import to_datetime
+from skit_labels.utils import large_csv_fields, to_datetime
+from skit_labels import codec
 from skit_labels import constants as const
+from skit_labels import metrics
 from skit_labels.types import (
     AudioSegmentTask,
     CallTranscriptionTask,
@@ -26,6 +41,94 @@ from skit_labels.types import (
 )
 
 
+class RawJSON(str):
+    """
+    A json encoded string which is stored as is instead of being encoded again.
+    """
+
+
+def to_json(value, compact: bool = False) -> str:
+    if isinstance(value, RawJSON):
+        return value
+    return codec.dumps_compact(value) if compact else codec.dumps(value)
+
+
+class _Decoded(threading.local):
+    # Length of the json text decoded by this thread since `fetch_page`
+    # last started.
+    size = 0
+
+
+_decoded = _Decoded()
+
+
+def loads_counted(value: str) -> Any:
+    _decoded.size += len(value)
+    return codec.loads(value)
+
+
+class JSONConnection(psycopg2.extensions.connection):
+    """
+    Connection which decodes json and jsonb columns with `codec.loads`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        psycopg2.extras.register_default_json(self, loads=loads_counted)
+        psycopg2.extras.register_default_jsonb(self, loads=loads_counted)
+
+
+def fetch_page(cur) -> List[Tuple]:
+    """
+    Fetch the rows of a page of a download and count them as fetched. The
+    json text of the rows, nearly all of their size, counts as bytes fetched.
+    Rows are decoded on fetch, so coroutines on one thread can't mix up their
+    counts.
+    """
+    _decoded.size = 0
+    rows = cur.fetchall()
+    metrics.count(const.METRIC__ROWS_FETCHED, len(rows))
+    metrics.count(const.METRIC__BYTES_FETCHED, _decoded.size)
+    return rows
+
+
+async def wait_async(conn: psycopg2.extensions.connection):
+    """
+    Wait on the running event loop until the pending operation of a
+    connection in asynchronous mode is done.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            return
+        if state == psycopg2.extensions.POLL_READ:
+            add, remove = loop.add_reader, loop.remove_reader
+        elif state == psycopg2.extensions.POLL_WRITE:
+            add, remove = loop.add_writer, loop.remove_writer
+        else:
+            raise psycopg2.OperationalError(f"Unexpected poll state {state}.")
+
+        ready = loop.create_future()
+        fd = conn.fileno()
+        add(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            remove(fd)
+
+
+def encode_rows(rows: List[Tuple]) -> List[Tuple]:
+    """
+    Encode data and tag of rows for `SqliteDatabase.insert_rows` ahead of
+    the insert, which then stores them as they are.
+    """
+    return [
+        (i, RawJSON(to_json(d, compact=True)), RawJSON(to_json(t)), g, tt, ji)
+        for i, d, t, g, tt, ji in rows
+    ]
+
+
 def update_reftime(reftime, tz):
     try:
         reftime = to_datetime(reftime)
@@ -35,6 +138,61 @@ def update_reftime(reftime, tz):
         return reftime
 
 
+# ISO timestamps with an explicit offset as tog stores them, which every
+# supported python's `datetime.fromisoformat` parses.
+REFTIME_PATTERN = re.compile(
+    r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d{3}|\.\d{6})?[+-]\d{2}:\d{2}"
+)
+
+
+@lru_cache(maxsize=None)
+def _utc_offset(minutes: int) -> str:
+    sign = "-" if minutes < 0 else "+"
+    hours, minutes = divmod(abs(minutes), 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
+
+
+def update_reftimes(reftimes: List[Any], tz) -> List[Any]:
+    """
+    `update_reftime` over a batch. Values in the format tog stores are parsed
+    and converted together with pandas, anything else (naive or malformed
+    values, other formats) goes through `update_reftime` one by one.
+    """
+    updated = list(reftimes)
+    fast = [
+        i
+        for i, reftime in enumerate(reftimes)
+        if isinstance(reftime, str) and REFTIME_PATTERN.fullmatch(reftime)
+    ]
+    slow = set(range(len(reftimes))) - set(fast)
+
+    if fast:
+        try:
+            utc = pd.to_datetime([reftimes[i] for i in fast], utc=True)
+            local = utc.tz_convert(tz).tz_localize(None)
+            offsets = (local - utc.tz_localize(None)).total_seconds()
+        except (ValueError, OverflowError):
+            slow.update(fast)
+            fast = []
+        else:
+            # Same output as `datetime.isoformat`: microseconds only when
+            # non zero, offsets as +HH:MM.
+            stamps = np.datetime_as_string(local.values, unit="us").tolist()
+            minutes, seconds = np.divmod(offsets.values.astype(np.int64), 60)
+            for i, stamp, microsecond, minute, second in zip(
+                fast, stamps, utc.microsecond.tolist(), minutes.tolist(), seconds.tolist()
+            ):
+                if second:
+                    slow.add(i)
+                    continue
+                stamp = stamp if microsecond else stamp[:19]
+                updated[i] = stamp + _utc_offset(minute)
+
+    for i in slow:
+        updated[i] = update_reftime(reftimes[i], tz)
+    return updated
+
+
 def build_task(
     d: Dict, task_type: str, data_id: Optional[str] = None, tz=pytz.UTC
 ) -> Task:
@@ -64,9 +222,97 @@ def build_task(
     return task
 
 
+def _conversation_row(d: Dict, data_id, tz) -> Tuple[str, Dict]:
+    fields = ConversationTask.fields_from_dict(d)
+    missing = [name for name in CONVERSATION_REQUIRED if name not in fields]
+    if missing:
+        raise TypeError(f"Conversation task is missing required fields {missing}.")
+    return fields["conversation_uuid"], {
+        name: fields.get(name, default) for name, default in CONVERSATION_FIELDS
+    }
+
+
+def _conversation_reftimes(built: List[Tuple], tz):
+    # Reftimes from db are in UTC, see `build_task`.
+    task_dicts = [task_dict for _, task_dict, *_ in built]
+    reftimes = update_reftimes([task_dict["reftime"] for task_dict in task_dicts], tz)
+    for task_dict, reftime in zip(task_dicts, reftimes):
+        task_dict["reftime"] = reftime
+
+
+def _dict_row(d: Dict, data_id, tz) -> Tuple[str, Dict]:
+    return data_id, d
+
+
+def _attrs_row(task_type: str) -> Callable:
+    def build(d: Dict, data_id, tz) -> Tuple[str, Dict]:
+        task = build_task(d, task_type, data_id, tz=tz)
+        return task.id, attr.asdict(task)
+
+    return build
+
+
+# (name, default) of `ConversationTask` fields, in `attr.asdict` order.
+CONVERSATION_FIELDS = [
+    (field.name, None if field.default is attr.NOTHING else field.default)
+    for field in attr.fields(ConversationTask)
+]
+CONVERSATION_REQUIRED = [
+    field.name for field in attr.fields(ConversationTask) if field.default is attr.NOTHING
+]
+
+# Task type to a function building (task id, task dict) from a data dictionary.
+ROW_BUILDERS = {
+    const.TASK_TYPE__CONVERSATION: _conversation_row,
+    const.TASK_TYPE__DICT: _dict_row,
+    const.TASK_TYPE__SIMULATED_CALL: _attrs_row(const.TASK_TYPE__SIMULATED_CALL),
+    const.TASK_TYPE__AUDIO_SEGMENT: _attrs_row(const.TASK_TYPE__AUDIO_SEGMENT),
+    const.TASK_TYPE__CALL_TRANSCRIPTION: _attrs_row(const.TASK_TYPE__CALL_TRANSCRIPTION),
+    const.TASK_TYPE__DATA_GENERATION: _attrs_row(const.TASK_TYPE__DATA_GENERATION),
+}
+
+# Task type to a step run over each batch of built rows.
+BATCH_STEPS = {
+    const.TASK_TYPE__CONVERSATION: _conversation_reftimes,
+}
+
+
+def build_tasks(
+    rows: List[Tuple], task_type: str, job_id: str, tz=pytz.UTC
+) -> List[Tuple]:
+    """
+    Build rows for `SqliteDatabase.insert_rows` from (task_dict, tag, is_gold,
+    tagged_time, data_id) rows.
+
+    Gives the same rows as `build_task` followed by `attr.asdict`, but
+    conversation and dict tasks go straight to the task dict without building
+    a task object or copying the data.
+    """
+    try:
+        build = ROW_BUILDERS[task_type]
+    except KeyError:
+        raise TypeError(f"Invalid task type {task_type} provided.")
+
+    built = []
+    for task_dict, tag, is_gold, tagged_time, data_id in rows:
+        if isinstance(task_dict, RawJSON):
+            task_dict, tag = codec.loads(task_dict), codec.loads(tag)
+        task_id, task_dict = build(task_dict, data_id, tz)
+        built.append((task_id, task_dict, tag, bool(is_gold), tagged_time, job_id))
+
+    if built and task_type in BATCH_STEPS:
+        BATCH_STEPS[task_type](built, tz)
+    return built
+
+
 class SqliteDatabase:
     """
-    Class mapping to a local sqlite database file which can keep only one job.
+    Class mapping to a local sqlite database file which keeps one job, or
+    several told apart by job_id when written by `download_datasets`.
+
+    Downloads also keep their parameters, the id slices being fetched and one
+    row per committed batch next to the data so an interrupted download can be
+    resumed from the same file.
     """
 
     def __init__(self, filepath: str):
@@ -86,9 +332,28 @@ class SqliteDatabase:
             job_id TEXT NOT NULL
         )"""
         )
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )"""
+        )
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS download_ranges (
+            after_id INTEGER PRIMARY KEY,
+            until_id INTEGER NOT NULL
+        )"""
+        )
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS download_batches (
+            after_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            rows INTEGER NOT NULL
+        )"""
+        )
         self.conn.commit()
 
-    def insert_rows(self, rows: List):
+    def insert_rows(self, rows: List, checkpoint: Optional[Tuple[int, int]] = None):
         """
         Write rows in database. Each item of row is a tuple of following elements:
         - data_id : int
@@ -97,15 +362,150 @@ class SqliteDatabase:
         - is_gold: bool
         - tagged_time: Optional[str]
         - job_id: str
+
+        `checkpoint` is the (after_id, last_id) of the slice and the last source
+        id in this batch. It is committed along with the rows.
+        """
+
+        c = self.conn.cursor()
+        self._insert(c, rows)
+        if checkpoint is not None:
+            c.execute(
+                "INSERT INTO download_batches (after_id, last_id, rows) VALUES (?, ?, ?)",
+                (*checkpoint, len(rows)),
+            )
+        self.conn.commit()
+
+    def upsert_rows(self, rows: List):
+        """
+        Write rows in database replacing any existing rows with the same data_id.
         """
 
         c = self.conn.cursor()
+        c.execute("CREATE INDEX IF NOT EXISTS data_data_id ON data (data_id)")
+        c.executemany("DELETE FROM data WHERE data_id = ?", [(row[0],) for row in rows])
+        self._insert(c, rows)
+        self.conn.commit()
+
+    def create_indexes(self, by_job: bool = False):
+        c = self.conn.cursor()
+        c.execute("CREATE INDEX IF NOT EXISTS data_data_id ON data (data_id)")
+        c.execute("CREATE INDEX IF NOT EXISTS data_tagged_time ON data (tagged_time)")
+        c.execute("CREATE INDEX IF NOT EXISTS data_is_gold ON data (is_gold)")
+        if by_job:
+            c.execute("CREATE INDEX IF NOT EXISTS data_job_id ON data (job_id)")
+        self.conn.commit()
+
+    @contextmanager
+    def bulk_load(self, cache_size_mb: int = const.SQLITE_CACHE_SIZE_MB, by_job: bool = False):
+        """
+        Tune the file for a large load: write ahead logging, fsync only at
+        checkpoints and a larger page cache. Batches still commit along with
+        their checkpoints so an interrupted load can be resumed.
+
+        Indexes are built once the load is done, on job_id too with `by_job`
+        for files holding several jobs, and the file goes back to a rollback
+        journal so it is self contained again.
+        """
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute(f"PRAGMA cache_size = -{cache_size_mb * 1024}")
+        try:
+            yield self
+            self.create_indexes(by_job=by_job)
+        finally:
+            self.conn.execute("PRAGMA journal_mode = DELETE")
+            self.conn.execute("PRAGMA synchronous = FULL")
+
+    def _insert(self, c: sqlite3.Cursor, rows: List):
         c.executemany(
             "INSERT INTO data (data_id, data, tag, is_gold, tagged_time, job_id) VALUES (?, ?, ?, ?, ?, ?)",
-            [(i, json.dumps(d), json.dumps(t), g, tt, ji) for i, d, t, g, tt, ji in rows],
+            [(i, to_json(d, compact=True), to_json(t), g, tt, ji) for i, d, t, g, tt, ji in rows],
+        )
+
+    def high_water_mark(self) -> Optional[str]:
+        """
+        Latest tagged_time among stored rows.
+        """
+        return self.conn.execute("SELECT max(tagged_time) FROM data").fetchone()[0]
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT count(*) FROM data").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def get_metadata(self) -> Dict[str, Any]:
+        return {
+            key: json.loads(value)
+            for key, value in self.conn.execute("SELECT key, value FROM metadata")
+        }
+
+    def set_metadata(self, metadata: Dict[str, Any]):
+        """
+        Save metadata as json, values that aren't json serializable are saved as strings.
+        """
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value, default=str)) for key, value in metadata.items()],
+        )
+        self.conn.commit()
+
+    def start_download(self, metadata: Dict[str, Any], ranges: List[Tuple[int, int]]):
+        """
+        Record parameters and id slices of a new download.
+        """
+        self.conn.executemany(
+            "INSERT INTO download_ranges (after_id, until_id) VALUES (?, ?)", ranges
+        )
+        self.set_metadata(metadata)
+
+    def pending_ranges(self) -> List[Tuple[int, int, int]]:
+        """
+        Return (after_id, last_id, until_id) for every slice left to download.
+        `last_id` is the id of the last committed batch of that slice, or
+        `after_id` if nothing has been committed yet.
+        """
+        cur = self.conn.execute(
+            """SELECT r.after_id, coalesce(max(b.last_id), r.after_id), r.until_id
+            FROM download_ranges r LEFT JOIN download_batches b ON b.after_id = r.after_id
+            GROUP BY r.after_id, r.until_id
+            ORDER BY r.after_id"""
+        )
+        return [row for row in cur if row[1] < row[2]]
+
+    def mark_complete(self):
+        """
+        Record every slice as downloaded and account for every stored row,
+        after rows were upserted outside of download batches by a sync.
+        """
+        c = self.conn.cursor()
+        c.execute("DELETE FROM download_batches")
+        c.execute(
+            "INSERT INTO download_batches (after_id, last_id, rows) SELECT after_id, until_id, 0 FROM download_ranges"
+        )
+        # One more batch holding all the rows, within the first slice so it
+        # doesn't change what is pending.
+        c.execute(
+            """INSERT INTO download_batches (after_id, last_id, rows)
+            SELECT coalesce(min(after_id), 0), coalesce(min(after_id), 0), (SELECT count(*) FROM data)
+            FROM download_ranges"""
         )
         self.conn.commit()
 
+    def verify(self):
+        """
+        Check that every stored row is accounted for by a committed batch.
+        """
+        expected = self.conn.execute(
+            "SELECT coalesce(sum(rows), 0) FROM download_batches"
+        ).fetchone()[0]
+        found = self.count()
+        if expected != found:
+            raise RuntimeError(
+                f"{self.filepath} has {found} rows but its batches account for {expected}."
+            )
+
 
 class Database:
     """
@@ -119,8 +519,11 @@ class Database:
         password: Optional[str] = None,
         host: Optional[str] = None,
         port: Optional[Union[int, str]] = None,
+        pool_size: Optional[int] = None,
     ):
-        self._initialize(db=db, user=user, password=password, host=host, port=port)
+        self._initialize(
+            db=db, user=user, password=password, host=host, port=port, pool_size=pool_size
+        )
 
     def _initialize(
         self,
@@ -129,6 +532,7 @@ class Database:
         password: Optional[str] = None,
         host: Optional[str] = None,
         port: Optional[Union[int, str]] = None,
+        pool_size: Optional[int] = None,
     ):
         db = db or os.getenv(const.TOGDB_DB, "tog")
         user = user or os.getenv(const.TOGDB_USER)
@@ -140,10 +544,90 @@ class Database:
             raise ValueError(
                 "Credentials for Tog database not set. Check for missing environment variables."
             )
+        self.params = {
+            "host": host,
+            "database": db,
+            "user": user,
+            "password": password,
+            "port": port,
+        }
+
+        # With a pool_size, connections are opened lazily and reused across
+        # every job and query sharing this instance. `conn` stays checked out
+        # for callers that expect a single long lived connection.
+        if pool_size:
+            self.pool = psycopg2.pool.ThreadedConnectionPool(
+                1,
+                pool_size,
+                host=host,
+                database=db,
+                user=user,
+                password=password,
+                port=port,
+                connection_factory=JSONConnection,
+            )
+            self.conn = self.pool.getconn()
+            # It is held for the whole download, and only reads. Outside a
+            # transaction it isn't cut off by idle_in_transaction_session_timeout.
+            self.conn.autocommit = True
+        else:
+            self.pool = None
+            self.conn = psycopg2.connect(
+                host=host,
+                database=db,
+                user=user,
+                password=password,
+                port=port,
+                connection_factory=JSONConnection,
+            )
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool. Without a pool this is the shared
+        connection.
+        """
+        if self.pool is None:
+            yield self.conn
+            return
 
-        self.conn = psycopg2.connect(
-            host=host, database=db, user=user, password=password, port=port
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            self.pool.putconn(conn)
+
+    @asynccontextmanager
+    async def async_connection(self):
+        """
+        A new connection in asynchronous mode for use on the running event
+        loop, see `wait_async`. These are always in autocommit and can't COPY.
+        """
+        conn = psycopg2.connect(
+            **self.params, connection_factory=JSONConnection, async_=True
         )
+        try:
+            await wait_async(conn)
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        """
+        Close the connection or every connection in the pool.
+        """
+        if self.pool is None:
+            self.conn.close()
+        else:
+            self.pool.closeall()
+
+    def now(self) -> str:
+        """
+        Current time on the database server.
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT now()")
+            return cur.fetchone()[0].isoformat()
 
     def list_jobs(self) -> List[Dict]:
         with self.conn.cursor() as cur:
@@ -187,6 +671,52 @@ class AbstractJob(ABC):
         ...
 
 
+STATS_GROUPS = {
+    const.STATS__TAG: "jobs_task.tag::text",
+    const.STATS__DAY: "jobs_data.created_at::date",
+}
+# md5 of jobs_data.id as 0 to 2**32 - 1. `writers.shard_of` hashes a row's
+# data_id the same way, but only dict tasks keep jobs_data.id as their data_id.
+# Conversations use their conversation_uuid, so a sample of them isn't a subset
+# of a shard.
+SAMPLE_HASH = "('x' || substr(md5(jobs_data.id::text), 1, 8))::bit(32)::bigint"
+DATA_KEY = re.compile(r"\w+")
+
+
+def sql_text(value: str) -> str:
+    """
+    A text literal which can be inlined in any query: hex has no quotes to
+    escape or `%` to clash with query parameters.
+    """
+    return f"convert_from(decode('{value.encode().hex()}', 'hex'), 'UTF8')"
+
+
+# Strata are told apart by an md5 so thresholds can be inlined in queries
+# without quoting tags.
+SAMPLE_STRATA = {
+    const.STRATIFY__TAG: "md5(coalesce(jobs_task.tag::text, ''))",
+}
+
+# Keys of the task data every projected download keeps, by the task types
+# which can be built from a projection. Conversations read these in
+# `ConversationTask.fields_from_dict`.
+PROJECTION_REQUIRED = {
+    const.TASK_TYPE__CONVERSATION: [
+        "call_uuid",
+        "call_id",
+        "conversation_uuid",
+        "conversation_id",
+        "alternatives",
+        "utterances",
+        "audio_url",
+        "state",
+        "reftime",
+        "prediction",
+    ],
+    const.TASK_TYPE__DICT: [],
+}
+
+
 class Job(AbstractJob):
     """
     A Tog job which specifies a kind of tagging data set and problem.
@@ -205,6 +735,10 @@ class Job(AbstractJob):
         password: Optional[str] = None,
         host: Optional[str] = None,
         port: Optional[Union[str, int]] = None,
+        sample_fraction: Optional[float] = None,
+        stratify_by: Optional[str] = None,
+        filters: Optional[Dict[str, List[str]]] = None,
+        fields: Optional[List[str]] = None,
     ):
         self.id = id
         # TODO: Check task validity right here
@@ -224,6 +758,27 @@ class Job(AbstractJob):
         self.password = password
         self.host = host
         self.port = port
+        if sample_fraction is not None and not 0 < sample_fraction <= 1:
+            raise ValueError(f"Sample fraction should be in (0, 1], got {sample_fraction}.")
+        if stratify_by is not None and stratify_by not in SAMPLE_STRATA:
+            raise ValueError(f"Can't stratify by {stratify_by}, expected one of {list(SAMPLE_STRATA)}.")
+        self.sample_fraction = sample_fraction
+        self.stratify_by = stratify_by
+        self._strata = {}
+        for key, values in (filters or {}).items():
+            if not DATA_KEY.fullmatch(key):
+                raise ValueError(f"Invalid filter key {key}, expected letters, digits or _.")
+            if key == const.FILTER__IS_GOLD and not set(values) <= {"true", "false"}:
+                raise ValueError(f"Expected true or false for {key}, got {values}.")
+        self.filters = filters or {}
+        if fields:
+            if task_type not in PROJECTION_REQUIRED:
+                raise ValueError(f"Fields can't be projected for {task_type} tasks, only {list(PROJECTION_REQUIRED)}.")
+            for key in fields:
+                if not DATA_KEY.fullmatch(key):
+                    raise ValueError(f"Invalid field {key}, expected letters, digits or _.")
+            fields = list(dict.fromkeys(PROJECTION_REQUIRED[task_type] + list(fields)))
+        self.fields = fields or None
 
     def __repr__(self):
         f"Job {self.id}: {self.name} [language: {self.lang}]\n{self.description}"
@@ -268,6 +823,76 @@ class Job(AbstractJob):
             n = cur.fetchone()[0]
         return n
 
+    def stats(self, breakdowns=(), start_date=None, end_date=None) -> dict:
+        """
+        Return total, tagged and untagged counts for this job from a single
+        scan. `breakdowns` adds the gold count (`gold`) and the same counts
+        per tag (`tag`) and per day the items were added (`day`), computed in
+        that scan with grouping sets.
+        """
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+        groups = [
+            (key, expression)
+            for key, expression in STATS_GROUPS.items()
+            if key in breakdowns
+        ]
+        keys = ", ".join(expression for _, expression in groups)
+        grouping_sets = ", ".join(["()"] + [f"({expression})" for _, expression in groups])
+
+        with self.db.connection() as conn, conn.cursor() as cur, metrics.timed(const.METRIC__QUERY):
+            cur.execute(
+                f"""
+                SELECT
+                    count(*),
+                    count(*) FILTER (WHERE jobs_task.tag IS NOT NULL),
+                    count(*) FILTER (WHERE jobs_task.is_gold)
+                    {f", {keys}, GROUPING({keys})" if groups else ""}
+                FROM jobs_task INNER JOIN jobs_data ON
+                    jobs_data.id = jobs_task.data_id
+                WHERE
+                    {self._filters(True, False, start_date, end_date)}
+                {f"GROUP BY GROUPING SETS ({grouping_sets})" if groups else ""}
+                """
+            )
+            rows = cur.fetchall()
+
+        gold = const.STATS__GOLD in breakdowns
+
+        def counts(row):
+            n_total, n_tagged, n_gold = row[:3]
+            result = {
+                const.TOTAL: n_total,
+                const.TAGGED: n_tagged,
+                const.UNTAGGED: n_total - n_tagged,
+            }
+            if gold:
+                result[const.GOLD] = n_gold
+            return result
+
+        stats = {}
+        breakdown = {const.STATS_BREAKDOWN_KEYS[key]: {} for key, _ in groups}
+        ungrouped = (1 << len(groups)) - 1
+        for row in rows:
+            # GROUPING sets one bit per key, first key highest, for keys the
+            # row is aggregated over. All bits set is the job total.
+            mask = row[-1] if groups else ungrouped
+            if mask == ungrouped:
+                stats = counts(row)
+                continue
+            i = next(i for i in range(len(groups)) if not mask >> (len(groups) - 1 - i) & 1)
+            key, value = groups[i][0], row[3 + i]
+            if value is None:
+                # Untagged items, already counted in the totals.
+                continue
+            breakdown[const.STATS_BREAKDOWN_KEYS[key]][str(value)] = counts(row)
+
+        if not stats:
+            stats = counts((0, 0, 0))
+        for name, values in breakdown.items():
+            stats[name] = dict(sorted(values.items()))
+        return stats
+
     def get_by_data_id(self, id: int, cache=True, start_date=None, end_date=None):
         """
         Return task and tag using the data id
@@ -303,7 +928,7 @@ class Job(AbstractJob):
 
             task = build_task(task_dict, self.task_type, tz=self.tz)
             task.is_gold = bool(is_gold)
-            tag = json.loads(tag_list)
+            tag = codec.loads(tag_list)
 
             if cache:
                 self.cache[id] = (task, tag, tagged_time)
@@ -313,11 +938,6 @@ class Job(AbstractJob):
         """
         List all available job_ids
         """
-        import time
-        time.sleep(.5)
-        self.db = Database(
-            db=self.db_name, user=self.user, password=self.password, host=self.host, port=self.port
-        )
         with self.db.conn.cursor() as cursor:
             cursor.execute('select "taskType" from jobs_job where id = %s', (self.id,))
             record = cursor.fetchone()
@@ -350,17 +970,12 @@ class Job(AbstractJob):
         FROM jobs_task INNER JOIN jobs_data ON
             jobs_data.id = jobs_task.data_id
         WHERE
-            jobs_task.job_id = {self.id}
-            {'' if untagged else 'AND jobs_task.tag IS NOT NULL'}
-            {"AND jobs_task.is_gold = true" if only_gold else ''}
-            {f"AND jobs_data.created_at >= '{start_date}'" if start_date else ''}
-            {f"AND jobs_data.created_at < '{end_date}'" if end_date else ''}
+            {self._filters(untagged, only_gold, start_date, end_date)}
         """
         with self.db.conn.cursor() as cur:
             cur.itersize = itersize
             cur.execute(query)
             data_ids = [x[0] for x in cur.fetchall()]
-        self.db.conn.close()
         return data_ids
 
 
@@ -379,14 +994,15 @@ class Job(AbstractJob):
 
         If `untagged` is True, also return untagged items. This might be useful
         for checking, say, production metrics. If `only_gold` is True, return
-        only items which are marked as gold.
+        only items which are marked as gold. Items of `data_ids` are filtered
+        by these and the job's filters in the query too.
         """
         start_date = start_date or self.start_date
         end_date = end_date or self.end_date
 
         query = f"""
         SELECT
-            jobs_data.data,
+            {self._data_column()},
             jobs_task.tag,
             jobs_task.is_gold,
             jobs_task.tagged_time,
@@ -394,21 +1010,356 @@ class Job(AbstractJob):
         FROM jobs_task INNER JOIN jobs_data ON
             jobs_data.id = jobs_task.data_id
         WHERE
-            jobs_task.data_id IN {tuple(data_ids)}
+            jobs_task.data_id = ANY(%(data_ids)s)
+            AND {self._filters(untagged, only_gold, start_date, end_date)}
         """
-        db = Database(self.db_name, self.user, self.password, host=self.host, port=self.port)
         items = []
-        with db.conn.cursor() as cur:
-            cur.execute(query)
+        with self.db.connection() as conn, conn.cursor() as cur:
+            cur.execute(query, {"data_ids": list(data_ids)})
 
             for row in cur:
                 task_dict, tag, is_gold, tagged_time, data_id = row
                 task = build_task(task_dict, self.task_type, data_id, tz=self.tz)
                 task.is_gold = bool(is_gold)
                 items.append((task, tag, tagged_time))
-        db.conn.close()
         return items
 
+    def _data_column(self) -> str:
+        """
+        The task data, only the keys in `fields` when they are set so the rest
+        is never sent by the database. Keys missing from a row stay missing.
+        """
+        if not self.fields:
+            return "jobs_data.data"
+        keys = ", ".join(f"'{key}'" for key in self.fields)
+        return f"""(
+            SELECT coalesce(jsonb_object_agg(key, value), '{{}}')
+            FROM jsonb_each(jobs_data.data::jsonb)
+            WHERE key IN ({keys})
+        )"""
+
+    def _filters(
+        self,
+        untagged=False,
+        only_gold=False,
+        start_date=None,
+        end_date=None,
+        since=None,
+        sample=True,
+    ) -> str:
+        """
+        SQL conditions over `jobs_task` and `jobs_data` selecting this job's rows.
+        With `since`, only rows added or tagged after that time. Jobs with a
+        `sample_fraction` select only their sample unless `sample` is False.
+        """
+        return f"""
+            jobs_task.job_id = {self.id}
+            {'' if untagged else 'AND jobs_task.tag IS NOT NULL'}
+            {"AND jobs_task.is_gold = true" if only_gold else ''}
+            {f"AND jobs_data.created_at >= '{start_date}'" if start_date else ''}
+            {f"AND jobs_data.created_at < '{end_date}'" if end_date else ''}
+            {f"AND (jobs_task.tagged_time > '{since}' OR jobs_data.created_at > '{since}')" if since else ''}
+            {self._value_filters()}
+            {self._sample_filter(untagged, start_date, end_date) if sample and self.sample_fraction else ''}
+        """
+
+    def _value_filters(self) -> str:
+        """
+        Conditions for `filters`, any of the values of a key and every key
+        have to match. `tag` matches a value anywhere in the tag, `is_gold` the
+        gold flag and other keys the top level field of the task data.
+        """
+        conditions = []
+        for key, values in self.filters.items():
+            if key == const.FILTER__TAG:
+                matches = [
+                    f"jsonb_path_exists(jobs_task.tag::jsonb, '$.** ? (@ == $value)', jsonb_build_object('value', {sql_text(value)}))"
+                    for value in values
+                ]
+            elif key == const.FILTER__IS_GOLD:
+                matches = [f"jobs_task.is_gold = {value}" for value in values]
+            else:
+                matches = [f"jobs_data.data->>'{key}' = {sql_text(value)}" for value in values]
+            conditions.append(f"AND ({' OR '.join(matches)})")
+        return " ".join(conditions)
+
+    def _sample_filter(self, untagged=False, start_date=None, end_date=None) -> str:
+        """
+        Keep rows whose `SAMPLE_HASH` falls in the sample, so the same rows are
+        picked every time. A stratified sample takes the same fraction of every
+        stratum, with hash thresholds found once per job and filters.
+        """
+        if self.stratify_by is None:
+            return f"AND {SAMPLE_HASH} < {int(self.sample_fraction * 2**32)}"
+
+        key = (untagged, str(start_date), str(end_date))
+        if key not in self._strata:
+            stratum = SAMPLE_STRATA[self.stratify_by]
+            with self.db.connection() as conn, conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT {stratum}, percentile_disc({self.sample_fraction}) WITHIN GROUP (ORDER BY {SAMPLE_HASH})
+                    FROM jobs_task INNER JOIN jobs_data ON
+                        jobs_data.id = jobs_task.data_id
+                    WHERE
+                        {self._filters(untagged, False, start_date, end_date, sample=False)}
+                    GROUP BY 1
+                    """
+                )
+                self._strata[key] = dict(cur.fetchall())
+        thresholds = codec.dumps_compact(self._strata[key])
+        return f"AND {SAMPLE_HASH} <= coalesce(('{thresholds}'::jsonb ->> {SAMPLE_STRATA[self.stratify_by]})::bigint, -1)"
+
+    def id_range(self, untagged=False, only_gold=False, start_date=None, end_date=None):
+        """
+        Return the smallest and largest `jobs_data.id` of this job, (None, None)
+        if there are no rows.
+        """
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+
+        with self.db.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT min(jobs_data.id), max(jobs_data.id)
+                FROM jobs_task INNER JOIN jobs_data ON
+                    jobs_data.id = jobs_task.data_id
+                WHERE
+                    {self._filters(untagged, only_gold, start_date, end_date)}
+                """
+            )
+            return cur.fetchone()
+
+    def fingerprint(self, untagged=False, start_date=None, end_date=None) -> List[Any]:
+        """
+        Row count and latest tagged_time of this job, which change whenever
+        rows are added or tagged.
+        """
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+
+        with self.db.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT count(*), max(jobs_task.tagged_time)
+                FROM jobs_task INNER JOIN jobs_data ON
+                    jobs_data.id = jobs_task.data_id
+                WHERE
+                    {self._filters(untagged, False, start_date, end_date)}
+                """
+            )
+            return list(cur.fetchone())
+
+    def iter_rows(
+        self,
+        untagged=False,
+        batch_size=1000,
+        only_gold=False,
+        start_date=None,
+        end_date=None,
+        after_id=None,
+        until_id=None,
+        since=None,
+    ):
+        """
+        Return (generator) batches of raw rows from the database. The last
+        element of each row is the `jobs_data.id` used for pagination.
+
+        Rows are paged with a keyset over `jobs_data.id` instead of an id list
+        so memory stays flat and each page costs the same regardless of how
+        far we are into the job. `after_id` (exclusive) and `until_id`
+        (inclusive) restrict the pages to a slice of the id space.
+        """
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+
+        last_id = after_id
+        while True:
+            query = self._page_query(
+                untagged, only_gold, start_date, end_date, since, last_id, until_id
+            )
+            params = {"last_id": last_id, "until_id": until_id, "limit": batch_size}
+            with self.db.connection() as conn, conn.cursor() as cur, metrics.timed(const.METRIC__QUERY):
+                cur.execute(query, params)
+                rows = fetch_page(cur)
+
+            if not rows:
+                return
+            yield rows
+
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][-1]
+
+    async def aiter_rows(
+        self,
+        untagged=False,
+        batch_size=1000,
+        only_gold=False,
+        start_date=None,
+        end_date=None,
+        after_id=None,
+        until_id=None,
+        since=None,
+    ):
+        """
+        Same as `iter_rows` but an async generator paging on a connection of
+        its own in asynchronous mode, so pages of several slices can be
+        awaited together on one event loop.
+        """
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+
+        last_id = after_id
+        async with self.db.async_connection() as conn:
+            while True:
+                query = self._page_query(
+                    untagged, only_gold, start_date, end_date, since, last_id, until_id
+                )
+                params = {"last_id": last_id, "until_id": until_id, "limit": batch_size}
+                cur = conn.cursor()
+                try:
+                    with metrics.timed(const.METRIC__QUERY):
+                        cur.execute(query, params)
+                        await wait_async(conn)
+                        rows = fetch_page(cur)
+                finally:
+                    cur.close()
+
+                if not rows:
+                    return
+                yield rows
+
+                if len(rows) < batch_size:
+                    return
+                last_id = rows[-1][-1]
+
+    def _page_query(
+        self,
+        untagged=False,
+        only_gold=False,
+        start_date=None,
+        end_date=None,
+        since=None,
+        last_id=None,
+        until_id=None,
+    ) -> str:
+        """
+        Query for a page of `iter_rows`, at most `%(limit)s` rows after
+        `%(last_id)s` and up to `%(until_id)s` when those are set.
+        """
+        return f"""
+        SELECT
+            {self._data_column()},
+            jobs_task.tag,
+            jobs_task.is_gold,
+            jobs_task.tagged_time,
+            jobs_data.id
+        FROM jobs_task INNER JOIN jobs_data ON
+            jobs_data.id = jobs_task.data_id
+        WHERE
+            {self._filters(untagged, only_gold, start_date, end_date, since)}
+            {'' if last_id is None else 'AND jobs_data.id > %(last_id)s'}
+            {'' if until_id is None else 'AND jobs_data.id <= %(until_id)s'}
+        ORDER BY jobs_data.id
+        LIMIT %(limit)s
+        """
+
+    def copy_rows(
+        self,
+        untagged=False,
+        batch_size=1000,
+        only_gold=False,
+        start_date=None,
+        end_date=None,
+        after_id=None,
+        until_id=None,
+    ):
+        """
+        Same as `iter_rows` but each page of `const.COPY_PAGE_BATCHES`
+        batches is streamed with a single `COPY ... TO STDOUT` into a
+        temporary file and read back, so memory holds one page at most.
+        `data` and `tag` are left as json text.
+        """
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+
+        page_size = batch_size * const.COPY_PAGE_BATCHES
+        last_id = after_id
+        while True:
+            query = f"""
+            COPY (
+                SELECT
+                    {self._data_column()}::text,
+                    coalesce(to_json(jobs_task.tag)::text, 'null'),
+                    jobs_task.is_gold,
+                    jobs_task.tagged_time,
+                    jobs_data.id
+                FROM jobs_task INNER JOIN jobs_data ON
+                    jobs_data.id = jobs_task.data_id
+                WHERE
+                    {self._filters(untagged, only_gold, start_date, end_date)}
+                    {'' if last_id is None else 'AND jobs_data.id > %(last_id)s'}
+                    {'' if until_id is None else 'AND jobs_data.id <= %(until_id)s'}
+                ORDER BY jobs_data.id
+                LIMIT %(limit)s
+            ) TO STDOUT WITH (FORMAT csv)
+            """
+            params = {"last_id": last_id, "until_id": until_id, "limit": page_size}
+            with tempfile.TemporaryFile("w+", encoding="utf-8", newline="") as f:
+                with self.db.connection() as conn, conn.cursor() as cur:
+                    with metrics.timed(const.METRIC__QUERY):
+                        cur.copy_expert(cur.mogrify(query, params).decode(), f)
+                    f.flush()
+                    metrics.count(const.METRIC__BYTES_FETCHED, os.fstat(f.fileno()).st_size)
+                    f.seek(0)
+                    # The timestamptz typecaster needs the cursor open.
+                    with large_csv_fields():
+                        rows = [
+                            (
+                                RawJSON(task_json),
+                                RawJSON(tag_json),
+                                is_gold == "t",
+                                psycopg2.extensions.PYDATETIMETZ(tagged_time or None, cur),
+                                int(data_id),
+                            )
+                            for task_json, tag_json, is_gold, tagged_time, data_id in csv.reader(f)
+                        ]
+            metrics.count(const.METRIC__ROWS_FETCHED, len(rows))
+
+            for i in range(0, len(rows), batch_size):
+                yield rows[i : i + batch_size]
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][-1]
+
+    def build_items(self, rows):
+        """
+        Build (task, tag, tagged_time) items from rows of `iter_rows`.
+        """
+        items = []
+        for task_dict, tag, is_gold, tagged_time, data_id in rows:
+            if isinstance(task_dict, RawJSON):
+                task_dict, tag = codec.loads(task_dict), codec.loads(tag)
+            task = build_task(task_dict, self.task_type, data_id, tz=self.tz)
+            task.is_gold = bool(is_gold)
+            items.append((task, tag, tagged_time))
+        return items
+
+    def build_rows(self, rows, job_id: str) -> List[Tuple]:
+        """
+        Build rows for `SqliteDatabase.insert_rows` from rows of `iter_rows`.
+        """
+        return build_tasks(rows, self.task_type, job_id, tz=self.tz)
+
+    def iter_batches(self, **kwargs):
+        """
+        Return (generator) batches of tasks and tags from the database. Takes
+        the same arguments as `iter_rows`.
+        """
+        for rows in self.iter_rows(**kwargs):
+            yield self.build_items(rows)
+
 
 class LabelstudioJob(AbstractJob):
     """
@@ -524,7 +1475,7 @@ class LabelstudioJob(AbstractJob):
                 raise RuntimeError("No item found for given data id")
 
             task = build_task(task_dict, task_type='conversation', tz=self.tz)
-            tag = json.loads(tag_list)[0]["value"]["choices"][0]
+            tag = codec.loads(tag_list)[0]["value"]["choices"][0]
 
             if cache:
                 self.cache[id] = (task, tag, tagged_time)
@@ -571,7 +1522,6 @@ class LabelstudioJob(AbstractJob):
             cur.itersize = itersize
             cur.execute(query)
             data_ids = [x[0] for x in cur.fetchall()]
-        self.db.conn.close()
         return data_ids
 
 
@@ -615,9 +1565,8 @@ class LabelstudioJob(AbstractJob):
                 {f"AND task_completion_created_at <= '{end_date}'" if isinstance(end_date, str) else ''}
             """
         
-        db = Database(self.db_name, self.user, self.password, host=self.host, port=self.port)
         items = []
-        with db.conn.cursor() as cur:
+        with self.db.connection() as conn, conn.cursor() as cur:
             cur.execute(query)
 
             for row in cur:
@@ -625,9 +1574,146 @@ class LabelstudioJob(AbstractJob):
                 task = build_task(task_dict, "conversation", data_id, tz=self.tz)
                 task.is_gold = True
                 items.append((task, tag_list, tagged_time))
-        db.conn.close()
         return items
 
+    def _labelstudio_data(self, untagged=False, start_date=None, end_date=None) -> str:
+        """
+        Query over labelstudio tables selecting this job's rows, one per
+        completion and keyed by `completion_id`. A task has as many rows as
+        completions, so `task.id` can't key them.
+        """
+        return f"""
+            WITH labelstudio_data as (
+                SELECT
+                    project.id as "job_id",
+                    task_completion.id as "completion_id",
+                    task.data->> 'conversation_uuid' as "data_id",
+                    task_completion.created_at as "task_completion_created_at",
+                    task.data,
+                    task_completion.result as "tag"
+                FROM project
+                INNER JOIN task on project.id=task.project_id
+                INNER JOIN task_completion on task_completion.task_id=task.id
+                {"" if untagged else "WHERE task_completion.result != '[]'"}
+            )
+
+            SELECT data_id, data, job_id, task_completion_created_at, tag, completion_id FROM labelstudio_data
+            WHERE
+                job_id={self.id}
+                {f"AND task_completion_created_at >= '{start_date}'" if isinstance(start_date, str) else ''}
+                {f"AND task_completion_created_at <= '{end_date}'" if isinstance(end_date, str) else ''}
+        """
+
+    def id_range(self, untagged=False, only_gold=False, start_date=None, end_date=None):
+        """
+        Return the smallest and largest labelstudio `task_completion.id` of
+        this job, (None, None) if there are no rows.
+        """
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+
+        with self.db.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT min(completion_id), max(completion_id) FROM (
+                    {self._labelstudio_data(untagged, start_date, end_date)}
+                ) AS rows
+                """
+            )
+            return cur.fetchone()
+
+    def fingerprint(self, untagged=False, start_date=None, end_date=None) -> List[Any]:
+        """
+        Row count and latest completion update of this job, which change
+        whenever completions are added or edited.
+        """
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+
+        with self.db.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT count(*), max(task_completion.updated_at) FROM (
+                    {self._labelstudio_data(untagged, start_date, end_date)}
+                ) AS rows
+                INNER JOIN task_completion ON task_completion.id = rows.completion_id
+                """
+            )
+            return list(cur.fetchone())
+
+    def iter_rows(
+        self,
+        untagged=False,
+        batch_size=1000,
+        only_gold=False,
+        start_date=None,
+        end_date=None,
+        after_id=None,
+        until_id=None,
+    ):
+        """
+        Return (generator) batches of raw rows from the database, paged with
+        a keyset over labelstudio's `task_completion.id` which is the last
+        element of each row.
+        """
+        start_date = start_date or self.start_date
+        end_date = end_date or self.end_date
+
+        last_id = after_id
+        while True:
+            query = f"""
+            {self._labelstudio_data(untagged, start_date, end_date)}
+                {'' if last_id is None else 'AND completion_id > %(last_id)s'}
+                {'' if until_id is None else 'AND completion_id <= %(until_id)s'}
+            ORDER BY completion_id
+            LIMIT %(limit)s
+            """
+            params = {"last_id": last_id, "until_id": until_id, "limit": batch_size}
+            with self.db.connection() as conn, conn.cursor() as cur, metrics.timed(const.METRIC__QUERY):
+                cur.execute(query, params)
+                rows = fetch_page(cur)
+
+            if not rows:
+                return
+            yield rows
+
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][-1]
+
+    def build_items(self, rows):
+        """
+        Build (task, tag, tagged_time) items from rows of `iter_rows`.
+        """
+        items = []
+        for data_id, task_dict, job_id, tagged_time, tag_list, _ in rows:
+            task = build_task(task_dict, "conversation", data_id, tz=self.tz)
+            task.is_gold = True
+            items.append((task, tag_list, tagged_time))
+        return items
+
+    def build_rows(self, rows, job_id: str) -> List[Tuple]:
+        """
+        Build rows for `SqliteDatabase.insert_rows` from rows of `iter_rows`.
+        """
+        return build_tasks(
+            [
+                (task_dict, tag_list, True, tagged_time, data_id)
+                for data_id, task_dict, _, tagged_time, tag_list, _ in rows
+            ],
+            const.TASK_TYPE__CONVERSATION,
+            job_id,
+            tz=self.tz,
+        )
+
+    def iter_batches(self, **kwargs):
+        """
+        Return (generator) batches of tasks and tags from the database. Takes
+        the same arguments as `iter_rows`.
+        """
+        for rows in self.iter_rows(**kwargs):
+            yield self.build_items(rows)
+
 
 class JobLocal(AbstractJob):
     """
@@ -677,9 +1763,9 @@ class JobLocal(AbstractJob):
         except TypeError:
             raise RuntimeError("No item found for given data id")
 
-        task = build_task(json.loads(task_dict), self.task_type, tz=self.tz)
+        task = build_task(codec.loads(task_dict), self.task_type, tz=self.tz)
         task.is_gold = bool(is_gold)
-        tag = json.loads(tag_list)
+        tag = codec.loads(tag_list)
         if show_source:
             return task, tag, tagged_time, source
         return task, tag, tagged_time
@@ -720,13 +1806,13 @@ class JobLocal(AbstractJob):
                 id_, task_dict, tag, is_gold, tagged_time = row
             else:
                 task_dict, tag, is_gold, tagged_time = row
-            task = build_task(json.loads(task_dict), self.task_type, tz=self.tz)
+            task = build_task(codec.loads(task_dict), self.task_type, tz=self.tz)
             task.is_gold = bool(is_gold)
             if show_source and show_ids:
-                yield id_, task, json.loads(tag), tagged_time, source
+                yield id_, task, codec.loads(tag), tagged_time, source
             elif show_source:
-                yield task, json.loads(tag), tagged_time, source
+                yield task, codec.loads(tag), tagged_time, source
             elif show_ids:
-                yield id_, task, json.loads(tag), tagged_time
+                yield id_, task, codec.loads(tag), tagged_time
             else:
-                yield task, json.loads(tag), tagged_time
+                yield task, codec.loads(tag), tagged_time
@@ -0,0 +1,69 @@
+"""
+Timers and counters of the phases of a command, written by `--metrics-out`.
+
+Phases are timed where they run: queries in `db`, transforms, writes and
+requests in `commands`. Timers add up the time spent in a phase over every
+thread and coroutine, so with several workers a phase can take longer than
+the command itself. Everything is kept per process and starts from zero with
+`reset`.
+"""
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict
+
+_lock = threading.Lock()
+_seconds: Dict[str, float] = defaultdict(float)
+_calls: Dict[str, int] = defaultdict(int)
+_counters: Dict[str, int] = defaultdict(int)
+
+
+def reset():
+    with _lock:
+        _seconds.clear()
+        _calls.clear()
+        _counters.clear()
+
+
+def count(name: str, n: int = 1):
+    with _lock:
+        _counters[name] += n
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Add the time spent in the block to phase `name`, whether it raises or not.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _seconds[name] += elapsed
+            _calls[name] += 1
+
+
+def report() -> Dict[str, Any]:
+    """
+    Seconds and calls of each phase along with the counters.
+    """
+    with _lock:
+        return {
+            "phases": {
+                name: {"seconds": round(seconds, 6), "calls": _calls[name]}
+                for name, seconds in sorted(_seconds.items())
+            },
+            "counters": dict(sorted(_counters.items())),
+        }
+
+
+def write(filepath: str, **extra: Any):
+    """
+    Write `extra` and the report as json.
+    """
+    with open(filepath, "w") as f:
+        json.dump({**extra, **report()}, f, indent=2, default=str)
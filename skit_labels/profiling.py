@@ -0,0 +1,175 @@
+"""
+CPU and memory profiles of a command, written by `--profile`.
+
+A cpu profile runs cProfile in the main thread and in every thread started
+while it is on, so the fetch and transform stages of a download are
+included. The merged stats are dumped for `pstats` or snakeviz along with the
+cumulative time of each of `const.PROFILE_STAGES` and the top functions.
+
+A memory profile traces allocations with tracemalloc. Each stage records its
+peak over the memory in use when it was called, and the top lines still
+holding memory when it returns.
+"""
+import cProfile
+import functools
+import io
+import pstats
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List
+
+from skit_labels import commands
+from skit_labels import constants as const
+
+
+def mib(size: int) -> str:
+    return f"{size / 2**20:.1f} MiB"
+
+
+class CpuProfiler:
+    def __init__(self, top: int = const.PROFILE_TOP):
+        self.top = top
+        self.profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def _enable(self):
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def _start_thread(self, *args):
+        # Called on the first event of each new thread, cProfile takes over
+        # from here.
+        sys.setprofile(None)
+        self._enable()
+
+    @contextmanager
+    def running(self):
+        threading.setprofile(self._start_thread)
+        self._enable()
+        try:
+            yield self
+        finally:
+            self.profiles[0].disable()
+            threading.setprofile(None)
+
+    def stages(self, stats: pstats.Stats) -> Dict[str, List[float]]:
+        """
+        Calls and cumulative seconds of each stage over every thread.
+        """
+        stages = {}
+        for (filename, _, name), (_, calls, _, cumulative, _) in stats.stats.items():
+            if name in const.PROFILE_STAGES and filename == commands.__file__:
+                total = stages.setdefault(name, [0, 0.0])
+                total[0] += calls
+                total[1] += cumulative
+        return stages
+
+    def write(self, base: str) -> List[str]:
+        """
+        Write `base`.cpu.prof and a summary in `base`.cpu.txt.
+        """
+        summary = io.StringIO()
+        with self._lock:
+            stats = pstats.Stats(*self.profiles, stream=summary)
+        stats.dump_stats(f"{base}.cpu.prof")
+
+        summary.write(f"{'stage':>28} {'calls':>8} {'cumulative s':>14}\n")
+        for name, (calls, cumulative) in sorted(self.stages(stats).items(), key=lambda item: -item[1][1]):
+            summary.write(f"{name:>28} {calls:>8} {cumulative:>14.3f}\n")
+        summary.write(f"\nTop {self.top} functions over {len(self.profiles)} threads:\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        with open(f"{base}.cpu.txt", "w") as f:
+            f.write(summary.getvalue())
+        return [f"{base}.cpu.prof", f"{base}.cpu.txt"]
+
+
+class MemoryProfiler:
+    def __init__(self, top: int = const.PROFILE_TOP):
+        self.top = top
+        self.stages: Dict[str, dict] = {}
+        self.peak = 0
+        self.top_lines: List[tracemalloc.Statistic] = []
+        # [memory in use when a stage was called, its peak so far], innermost
+        # last. The first entry is the whole command.
+        self._stack: List[List[int]] = []
+
+    def _top_lines(self) -> List[tracemalloc.Statistic]:
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        return snapshot.statistics("lineno")[: self.top]
+
+    def _enter(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self._stack[-1][1] = max(self._stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._stack.append([current, current])
+
+    def _exit(self, name: str):
+        current, peak = tracemalloc.get_traced_memory()
+        start, stage_peak = self._stack.pop()
+        stage_peak = max(stage_peak, peak)
+        self._stack[-1][1] = max(self._stack[-1][1], stage_peak)
+
+        stage = self.stages.setdefault(name, {"calls": 0, "peak": 0, "net": 0})
+        stage["calls"] += 1
+        stage["peak"] = max(stage["peak"], stage_peak - start)
+        stage["net"] += current - start
+        stage["top_lines"] = self._top_lines()
+
+    def _wrap(self, name: str, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            self._enter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._exit(name)
+
+        return wrapper
+
+    @contextmanager
+    def running(self):
+        # Stages are looked up from the module when called, wrapping them
+        # there covers calls from other commands.
+        originals = {name: getattr(commands, name) for name in const.PROFILE_STAGES}
+        tracemalloc.start()
+        self._stack = [[tracemalloc.get_traced_memory()[0], 0]]
+        for name, fn in originals.items():
+            setattr(commands, name, self._wrap(name, fn))
+        try:
+            yield self
+        finally:
+            for name, fn in originals.items():
+                setattr(commands, name, fn)
+            start, peak = self._stack[0]
+            self.peak = max(peak, tracemalloc.get_traced_memory()[1]) - start
+            self.top_lines = self._top_lines()
+            tracemalloc.stop()
+
+    def write(self, base: str) -> List[str]:
+        """
+        Write the peak of each stage and the top lines in `base`.memory.txt.
+        """
+        lines = [f"Peak traced memory: {mib(self.peak)}", ""]
+        lines.append(f"{'stage':>28} {'calls':>8} {'peak':>12} {'net':>12}")
+        for name, stage in self.stages.items():
+            lines.append(f"{name:>28} {stage['calls']:>8} {mib(stage['peak']):>12} {mib(stage['net']):>12}")
+        for name, stage in self.stages.items():
+            lines.extend(["", f"Top {self.top} lines when {name} returned:"])
+            lines.extend(str(stat) for stat in stage["top_lines"])
+        lines.extend(["", f"Top {self.top} lines at the end:"])
+        lines.extend(str(stat) for stat in self.top_lines)
+        with open(f"{base}.memory.txt", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return [f"{base}.memory.txt"]
+
+
+PROFILERS = {
+    const.PROFILE__CPU: CpuProfiler,
+    const.PROFILE__MEMORY: MemoryProfiler,
+}
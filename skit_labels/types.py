@@ -2,7 +2,6 @@
 Core datatypes involved in testing and impact analysis system
 """
 
-import json
 import uuid
 from abc import ABC, abstractmethod
 from typing import List
@@ -10,6 +9,8 @@ from typing import List
 import attr
 from pydash import py_
 
+from skit_labels import codec
+
 
 class Task(ABC):
     """
@@ -69,7 +70,7 @@ class SimulatedTurn:
             if isinstance(d["prediction"], dict):
                 pred = d["prediction"]
             else:
-                pred = json.loads(d["prediction"])
+                pred = codec.loads(d["prediction"])
 
         return SimulatedTurn(
             id=d["id"],
@@ -195,7 +196,10 @@ class ConversationTask(Task):
         return self.conversation_uuid
 
     @staticmethod
-    def from_dict(d):
+    def fields_from_dict(d):
+        """
+        Keyword arguments for a `ConversationTask` from a tog data dictionary.
+        """
         call_uuid = (
             d.get("call_uuid") if d.get("call_uuid") is not None else d.get("call_id")
         )
@@ -208,25 +212,22 @@ class ConversationTask(Task):
             raise ValueError(f"No reference for call or conversation. {d.keys()}")
         alts_key = "utterances" if "utterances" in d.keys() else "alternatives"
         if d.get(alts_key) is not None:
-            d["alternatives"] = json.dumps(d[alts_key], ensure_ascii=False)
-        return ConversationTask(
+            d["alternatives"] = codec.dumps(d[alts_key], ensure_ascii=False)
+        return {
             **{
-                **py_.pick(
-                    d,
-                    [
-                        "alternatives",
-                        "audio_url",
-                        "state",
-                        "reftime",
-                        "prediction",
-                    ],
-                ),
-                "data_id": str(conversation_uuid),
-                "raw": d,
-                "call_uuid": str(call_uuid),
-                "conversation_uuid": str(conversation_uuid),
-            }
-        )
+                key: d[key]
+                for key in ("alternatives", "audio_url", "state", "reftime", "prediction")
+                if key in d
+            },
+            "data_id": str(conversation_uuid),
+            "raw": d,
+            "call_uuid": str(call_uuid),
+            "conversation_uuid": str(conversation_uuid),
+        }
+
+    @staticmethod
+    def from_dict(d):
+        return ConversationTask(**ConversationTask.fields_from_dict(d))
 
 
 @attr.s(slots=True)
@@ -1,8 +1,11 @@
 """
 Module provides access to logger config, session token and package version.
 """
+import csv
 import os
 import sys
+import threading
+from contextlib import contextmanager
 
 import toml
 from typing import Optional
@@ -12,6 +15,10 @@ import pandas as pd
 from typing import Union
 from skit_labels import constants as const
 
+_csv_limit_lock = threading.Lock()
+_csv_limit_readers = 0
+_csv_limit_default = csv.field_size_limit()
+
 LOG_LEVELS = ["CRITICAL", "ERROR", "WARNING", "SUCCESS", "INFO", "DEBUG", "TRACE"]
 
 
@@ -104,6 +111,27 @@ def to_datetime(d: str) -> datetime:
     return None
 
 
+@contextmanager
+def large_csv_fields():
+    """
+    Lift the csv module's 128 KiB limit on a field while reading, task json
+    can be larger. The limit is process wide, so it's restored only when the
+    last reader on any thread is done.
+    """
+    global _csv_limit_readers, _csv_limit_default
+    with _csv_limit_lock:
+        if _csv_limit_readers == 0:
+            _csv_limit_default = csv.field_size_limit(sys.maxsize)
+        _csv_limit_readers += 1
+    try:
+        yield
+    finally:
+        with _csv_limit_lock:
+            _csv_limit_readers -= 1
+            if _csv_limit_readers == 0:
+                csv.field_size_limit(_csv_limit_default)
+
+
 def add_data_label(input_file: str, data_label: Optional[str] = None) -> str:
     df = pd.read_csv(input_file)
     data_label = data_label or None
@@ -0,0 +1,293 @@
+"""
+Output writers which take batches of downloaded rows as they arrive, like
+`SqliteDatabase.insert_rows`, without staging the whole dataset first.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+from skit_labels import codec
+from skit_labels import constants as const
+from skit_labels.db import RawJSON, to_json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+BASE_COLUMNS = ["data_id", "tag", "is_gold", "tagged_time", "job_id"]
+EXTRA_COLUMN = "extra_data"
+
+
+def flatten_value(value: Any) -> Optional[str]:
+    """
+    Keep strings as they are, anything else is stored as json so a column
+    has the same type whatever the values of a batch.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    return codec.dumps(value, ensure_ascii=False)
+
+
+def to_timestamp(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def task_fields(tasks: List[Dict[str, Any]]) -> List[str]:
+    """
+    Top level keys of the tasks in the order they first appear.
+    """
+    return list(dict.fromkeys(key for task_dict in tasks for key in task_dict))
+
+
+def decode_task(task_dict: Any) -> Dict[str, Any]:
+    return codec.loads(task_dict) if isinstance(task_dict, RawJSON) else task_dict
+
+
+class ParquetWriter:
+    """
+    Write rows to a parquet file, one row group per batch.
+
+    Columns are `data_id` (string), `tag` (json), `is_gold`, `tagged_time`,
+    `job_id`, then a string column for each of `fields` and `extra_data`.
+    Task values are kept as they are when they are strings and stored as json
+    otherwise, so the schema doesn't depend on the values of any batch.
+    `fields` default to the top level keys of the first batch, keys which
+    show up only later go to `extra_data` as a json object.
+    """
+
+    def __init__(self, filepath: str, fields: Optional[List[str]] = None):
+        if pa is None:
+            raise ImportError(
+                "Parquet output needs pyarrow. Install it with `pip install skit-labels[parquet]`."
+            )
+        self.filepath = filepath
+        self.fields = fields
+        self.schema = None
+        self.writer = None
+
+    @staticmethod
+    def column_name(key: str) -> str:
+        # Same convention as the csv output for fields that clash with ours.
+        return f"data.{key}" if key in BASE_COLUMNS or key == EXTRA_COLUMN else key
+
+    def _open(self):
+        fields = [
+            pa.field("data_id", pa.string()),
+            pa.field("tag", pa.string()),
+            pa.field("is_gold", pa.bool_()),
+            pa.field("tagged_time", pa.timestamp("us", tz="UTC")),
+            pa.field("job_id", pa.int64()),
+        ]
+        fields += [pa.field(self.column_name(key), pa.string()) for key in self.fields]
+        fields.append(pa.field(EXTRA_COLUMN, pa.string()))
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(self.filepath, self.schema)
+
+    def _columns(self, rows: List[Tuple]) -> Dict[str, List]:
+        columns: Dict[str, List] = {name: [] for name in BASE_COLUMNS}
+        tasks = []
+        for data_id, task_dict, tag, is_gold, tagged_time, job_id in rows:
+            tasks.append(decode_task(task_dict))
+            columns["data_id"].append(str(data_id))
+            columns["tag"].append(to_json(tag))
+            columns["is_gold"].append(bool(is_gold))
+            columns["tagged_time"].append(to_timestamp(tagged_time))
+            columns["job_id"].append(int(job_id))
+
+        if self.fields is None:
+            self.fields = task_fields(tasks)
+        for key in self.fields:
+            columns[self.column_name(key)] = [
+                flatten_value(task_dict.get(key)) for task_dict in tasks
+            ]
+
+        known = set(self.fields)
+        columns[EXTRA_COLUMN] = []
+        for task_dict in tasks:
+            extra = {key: value for key, value in task_dict.items() if key not in known}
+            columns[EXTRA_COLUMN].append(flatten_value(extra) if extra else None)
+        return columns
+
+    def insert_rows(self, rows: List[Tuple], checkpoint: Optional[Tuple[int, int]] = None):
+        """
+        Write a batch of rows shaped like `SqliteDatabase.insert_rows` as a row
+        group. Checkpoints are ignored, parquet downloads can't be resumed.
+        """
+        if not rows:
+            return
+        columns = self._columns(rows)
+        if self.writer is None:
+            self._open()
+        arrays = [
+            pa.array(columns[field.name], type=field.type) for field in self.schema
+        ]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self.writer is None:
+            # Nothing was written, leave a valid file with the same columns.
+            self.fields = self.fields or []
+            self._open()
+        self.writer.close()
+
+
+def to_json_line(value: Any) -> str:
+    """
+    Compact json on a single line. Raw json passed through from postgres keeps
+    its original whitespace, a newline can only be whitespace there.
+    """
+    encoded = to_json(value, compact=True)
+    return encoded.replace("\n", " ") if "\n" in encoded else encoded
+
+
+def open_jsonl(filepath: str) -> IO[str]:
+    """
+    Open a text stream for writing, compressed according to the file extension.
+    """
+    if filepath.endswith(const.OUTPUT_FORMAT__JSONL_GZ):
+        return gzip.open(
+            filepath, "wt", encoding="utf-8", compresslevel=const.JSONL_GZIP_LEVEL
+        )
+    if filepath.endswith(const.OUTPUT_FORMAT__JSONL_ZST):
+        if zstandard is None:
+            raise ImportError(
+                "Zstandard output needs zstandard. Install it with `pip install skit-labels[zstd]`."
+            )
+        compressor = zstandard.ZstdCompressor(level=const.JSONL_ZSTD_LEVEL)
+        return io.TextIOWrapper(
+            compressor.stream_writer(open(filepath, "wb")), encoding="utf-8"
+        )
+    return open(filepath, "w", encoding="utf-8")
+
+
+class JSONLWriter:
+    """
+    Write rows as json lines to a plain, gzip (`.jsonl.gz`) or zstandard
+    (`.jsonl.zst`) compressed file, one object per row with the keys
+    `data_id`, `data`, `tag`, `is_gold`, `tagged_time` and `job_id`.
+
+    `data` and `tag` are nested json rather than encoded strings as in the
+    csv output.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.stream = open_jsonl(filepath)
+
+    def insert_rows(self, rows: List[Tuple], checkpoint: Optional[Tuple[int, int]] = None):
+        """
+        Append a batch of rows shaped like `SqliteDatabase.insert_rows`.
+        Checkpoints are ignored, jsonl downloads can't be resumed.
+        """
+        self.stream.write(
+            "".join(
+                f'{{"data_id":{to_json(data_id, compact=True)},'
+                f'"data":{to_json_line(task_dict)},'
+                f'"tag":{to_json_line(tag)},'
+                f'"is_gold":{"true" if is_gold else "false"},'
+                f'"tagged_time":{to_json(None if tagged_time is None else str(tagged_time))},'
+                f'"job_id":{int(job_id)}}}\n'
+                for data_id, task_dict, tag, is_gold, tagged_time, job_id in rows
+            )
+        )
+
+    def close(self):
+        self.stream.close()
+
+
+def shard_of(data_id: Any, shards: int) -> int:
+    """
+    Stable shard of a row, the same for a data_id across downloads and
+    processes, unlike `hash`.
+    """
+    return int(hashlib.md5(str(data_id).encode()).hexdigest()[:8], 16) % shards
+
+
+def shard_path(directory: str, shard: int, shards: int, output_format: str) -> str:
+    return os.path.join(directory, f"part-{shard:05d}-of-{shards:05d}{output_format}")
+
+
+def sha256sum(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_manifest(directory: str, paths: List[str], rows: List[int]) -> str:
+    """
+    Write `manifest.json` next to the shards with the rows and sha256 of each.
+    """
+    manifest = {
+        "shards": len(paths),
+        "rows": sum(rows),
+        "files": [
+            {"file": os.path.basename(path), "rows": n_rows, "sha256": sha256sum(path)}
+            for path, n_rows in zip(paths, rows)
+        ],
+    }
+    path = os.path.join(directory, const.SHARD_MANIFEST)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+class ShardedWriter:
+    """
+    Spread rows over `shards` files of `output_format` in `directory` by
+    `shard_of` their data_id, as they come in. Closing it writes the manifest.
+    """
+
+    def __init__(self, directory: str, output_format: str, shards: int):
+        self.filepath = directory
+        self.paths = [
+            shard_path(directory, shard, shards, output_format) for shard in range(shards)
+        ]
+        self.writers = [WRITERS[output_format](path) for path in self.paths]
+        self.rows = [0] * shards
+
+    def insert_rows(self, rows: List[Tuple], checkpoint: Optional[Tuple[int, int]] = None):
+        if rows and any(
+            isinstance(writer, ParquetWriter) and writer.fields is None for writer in self.writers
+        ):
+            # Every shard takes its columns from the first batch of the whole
+            # download, so the shards share a schema.
+            fields = task_fields([decode_task(row[1]) for row in rows])
+            for writer in self.writers:
+                writer.fields = fields
+        parts: List[List[Tuple]] = [[] for _ in self.writers]
+        for row in rows:
+            parts[shard_of(row[0], len(parts))].append(row)
+        for shard, part in enumerate(parts):
+            if part:
+                self.writers[shard].insert_rows(part)
+                self.rows[shard] += len(part)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+        write_manifest(self.filepath, self.paths, self.rows)
+
+
+WRITERS = {
+    const.OUTPUT_FORMAT__PARQUET: ParquetWriter,
+    const.OUTPUT_FORMAT__JSONL: JSONLWriter,
+    const.OUTPUT_FORMAT__JSONL_GZ: JSONLWriter,
+    const.OUTPUT_FORMAT__JSONL_ZST: JSONLWriter,
+}
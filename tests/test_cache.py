@@ -0,0 +1,37 @@
+import os
+
+from skit_labels.cache import DatasetCache
+
+
+def download(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_cache_hit_and_stale(tmp_path):
+    cache = DatasetCache(str(tmp_path / "cache"))
+    key = cache.key(job_id="1", full=False)
+
+    assert cache.get(key, [10, "2022-01-01"]) is None
+    path, dataset_type = cache.put(key, [10, "2022-01-01"], download(tmp_path, "job.csv", 10), "conversation")
+    assert path.startswith(str(tmp_path / "cache"))
+    assert cache.get(key, [10, "2022-01-01"]) == (path, "conversation")
+
+    assert cache.get(key, [11, "2022-01-02"]) is None
+    assert not os.path.exists(path)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = DatasetCache(str(tmp_path / "cache"), max_size_mb=1)
+    size = 400 * 1024
+    keys = [cache.key(job_id=str(i)) for i in range(3)]
+    cache.put(keys[0], [0], download(tmp_path, "0.csv", size), "dict")
+    cache.put(keys[1], [1], download(tmp_path, "1.csv", size), "dict")
+    assert cache.get(keys[0], [0]) is not None
+
+    cache.put(keys[2], [2], download(tmp_path, "2.csv", size), "dict")
+
+    assert cache.get(keys[1], [1]) is None
+    assert cache.get(keys[0], [0]) is not None
+    assert cache.get(keys[2], [2]) is not None
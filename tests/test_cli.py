@@ -0,0 +1,48 @@
+import argparse
+
+import pytest
+
+from skit_labels import cli, utils
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--output-format", ".sqlite", "--cache"],
+        ["--output-format", ".sqlite", "--shards", "2"],
+        [],
+        ["--output-format", ".sqlite", "--db", "label_studio"],
+    ],
+)
+def test_job_ids_rejects_options(monkeypatch, options):
+    monkeypatch.setattr(utils, "configure_logger", lambda level: None)
+    args = cli.build_cli().parse_args(["download", "tog", "--job-ids", "1", "2", *options])
+    with pytest.raises(argparse.ArgumentTypeError):
+        cli.cmd_to_str(args)
+
+
+@pytest.mark.parametrize("workers", ["0", "-1", "two"])
+def test_workers_must_be_positive(workers):
+    with pytest.raises(SystemExit):
+        cli.build_cli().parse_args(["download", "tog", "-j", "1", "--workers", workers])
+
+
+class FakeProfiler:
+    def write(self, base):
+        self.base = base
+        return [f"{base}.cpu.txt"]
+
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_profile_is_not_written_to_the_cache(tmp_path, monkeypatch, cached):
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "cache"
+    output = str(cache_dir / "key" / "job-1.csv") if cached else str(tmp_path / "out" / "job-1.csv")
+    args = cli.build_cli().parse_args(
+        ["download", "tog", "-j", "1", "--cache", "--cache-dir", str(cache_dir), "--profile", "cpu"]
+    )
+    profiler = FakeProfiler()
+
+    cli.write_profile(args, (output, "conversation"), profiler)
+
+    assert profiler.base == ("job-1.csv" if cached else output)
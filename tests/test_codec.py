@@ -0,0 +1,47 @@
+import json
+import math
+
+import pytest
+
+from skit_labels import codec
+
+
+PAYLOADS = [
+    {"alternatives": [[{"confidence": 0.9, "transcript": "héllo"}]], "reftime": None},
+    ["tag", 1, 2.5, True, None],
+    {"big": 2**70, "nan": float("nan")},
+    "plain",
+]
+
+
+@pytest.mark.parametrize("value", PAYLOADS)
+def test_dumps_matches_stdlib(value):
+    assert codec.dumps(value) == json.dumps(value)
+    assert codec.dumps(value, ensure_ascii=False) == json.dumps(value, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("value", PAYLOADS[:2])
+def test_round_trip(value):
+    assert codec.loads(codec.dumps_compact(value)) == value
+    assert codec.loads(json.dumps(value)) == value
+
+
+@pytest.mark.parametrize("value", PAYLOADS)
+def test_dumps_compact_matches_stdlib(value):
+    assert codec.dumps_compact(value) == json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def test_dumps_compact_keeps_non_finite_floats():
+    value = {"scores": [1.5, float("-inf")], "reftime": None, "nan": float("nan")}
+    assert codec.dumps_compact(value) == '{"scores":[1.5,-Infinity],"reftime":null,"nan":NaN}'
+    decoded = codec.loads(codec.dumps_compact(value))
+    assert decoded["scores"] == [1.5, float("-inf")] and math.isnan(decoded["nan"])
+
+
+def test_loads_falls_back_to_stdlib():
+    assert codec.loads('{"big": 1180591620717411303424}') == {"big": 2**70}
+    assert codec.loads(json.dumps({"n": float("inf")})) == {"n": float("inf")}
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads("{")
+    with pytest.raises(TypeError):
+        codec.loads(None)
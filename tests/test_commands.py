@@ -0,0 +1,174 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from skit_labels import commands, db, writers
+from skit_labels import constants as const
+from tests.test_db import FakeDatabase, make_rows
+
+
+@pytest.mark.parametrize(
+    "low, high, n, expected",
+    [
+        (1, 10, 1, [(0, 10)]),
+        (1, 10, 2, [(0, 5), (5, 10)]),
+        (1, 3, 5, [(0, 1), (1, 2), (2, 3)]),
+        (7, 7, 4, [(6, 7)]),
+    ],
+)
+def test_split_id_range(low, high, n, expected):
+    ranges = commands.split_id_range(low, high, n)
+    assert ranges == expected
+    assert ranges[0][0] == low - 1 and ranges[-1][1] == high
+    assert all(prev[1] == nxt[0] for prev, nxt in zip(ranges, ranges[1:]))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_sdb2df_chunks_match_unpack(tmp_path, chunk_size):
+    sdb = db.SqliteDatabase(str(tmp_path / "job.sqlite"))
+    tasks = [
+        {"n": 1, "flag": True, "meta": {"a": 1, "b": {"c": "x"}}, "data_id": "u1"},
+        {"n": 2.5, "flag": None, "alternatives": [[{"transcript": "hi"}]]},
+        {"n": 3, "score": 1, "meta": {"a": None}},
+        {"n": 4, "flag": False, "meta": {}, "score": 2, "mixed": "a"},
+        {"mixed": 1, "score": 3},
+    ]
+    sdb.insert_rows(
+        [(i, task, ["tag"], i % 2 == 0, None, "1") for i, task in enumerate(tasks, 1)]
+    )
+
+    expected = commands.unpack(pd.read_sql_query("SELECT * FROM data", sdb.conn))
+    output_file = commands.sdb2df(sdb, "1", chunk_size=chunk_size)
+    with open(output_file) as f:
+        assert f.read() == expected.to_csv(index=False)
+
+
+def test_sdb2df_shards(tmp_path):
+    sdb = db.SqliteDatabase(str(tmp_path / "job.sqlite"))
+    sdb.insert_rows([(i, {"n": i}, ["tag"], False, None, "1") for i in range(1, 101)])
+
+    output_dir = commands.sdb2df(sdb, "1", chunk_size=7, shards=3)
+
+    with open(os.path.join(output_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    assert manifest["rows"] == 100
+    shards = [pd.read_csv(os.path.join(output_dir, item["file"])) for item in manifest["files"]]
+    assert [len(shard) for shard in shards] == [item["rows"] for item in manifest["files"]]
+    assert all(len(shard) for shard in shards)
+    assert all(
+        writers.shard_of(data_id, 3) == i for i, shard in enumerate(shards) for data_id in shard["data_id"]
+    )
+    combined = pd.concat(shards).sort_values("data_id").reset_index(drop=True)
+    assert combined.equals(pd.read_csv(commands.sdb2df(sdb, "1")))
+
+
+def test_sdb2df_shards_postprocess(tmp_path):
+    sdb = db.SqliteDatabase(str(tmp_path / "job.sqlite"))
+    # Fields that only some rows have still make a column of every shard.
+    sdb.insert_rows(
+        [(i, {"n": i, **({"odd": True} if i % 2 else {})}, ["tag"], False, None, "1") for i in range(1, 101)]
+    )
+
+    def drop_odd(path):
+        df = pd.read_csv(path)
+        df[df["n"] % 2 == 0].to_csv(path, index=False)
+
+    output_dir = commands.sdb2df(sdb, "1", chunk_size=7, shards=3, postprocess=drop_odd)
+
+    with open(os.path.join(output_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    shards = [pd.read_csv(os.path.join(output_dir, item["file"])) for item in manifest["files"]]
+    assert manifest["rows"] == 50
+    assert [len(shard) for shard in shards] == [item["rows"] for item in manifest["files"]]
+    assert all(list(shard.columns) == list(shards[0].columns) for shard in shards)
+    assert "odd" in shards[0].columns
+
+
+def test_tog_job_options():
+    assert commands.tog_job_options(None, 0.0) == {"sample_fraction": 0.0}
+    assert commands.tog_job_options(None, None, None, {}, []) == {}
+    assert commands.tog_job_options(const.LABELSTUIO_DB, filters={}) == {}
+    with pytest.raises(ValueError):
+        commands.tog_job_options(const.LABELSTUIO_DB, 0.0)
+
+
+@pytest.mark.parametrize(
+    "metadata",
+    [
+        {"job_id": "1", "full": False},
+        {"job_id": "1", "full": False, "sample_fraction": 0.2},
+        {"job_id": "1", "full": False, "sample_fraction": 0.1, "fields": ["text"]},
+    ],
+)
+def test_resume_ranges_needs_same_options(tmp_path, metadata):
+    sdb = db.SqliteDatabase(str(tmp_path / "job.sqlite"))
+    sdb.start_download({"job_id": "1", "full": False, "sample_fraction": 0.1, "synced_at": "now"}, [(0, 10)])
+
+    assert commands.resume_ranges(sdb, None, None, 1, {"job_id": "1", "full": False, "sample_fraction": 0.1}) == [(0, 0, 10)]
+    with pytest.raises(ValueError):
+        commands.resume_ranges(sdb, None, None, 1, metadata)
+
+
+def test_run_stage_merges_producers():
+    producers = [lambda i=i: iter(range(i * 10, i * 10 + 5)) for i in range(3)]
+    items = list(commands.run_stage(producers, workers=2, maxsize=1))
+    assert sorted(items) == [i * 10 + j for i in range(3) for j in range(5)]
+
+
+def test_run_stage_raises_and_stops_producers():
+    produced = []
+
+    def failing():
+        yield 1
+        raise RuntimeError("boom")
+
+    def endless():
+        i = 0
+        while True:
+            produced.append(i)
+            yield i
+            i += 1
+
+    with pytest.raises(RuntimeError, match="boom"):
+        for _ in commands.run_stage([endless, failing], workers=2, maxsize=2):
+            pass
+    # Returning at all means the endless producer was stopped.
+    assert produced
+
+
+@pytest.mark.parametrize("engine", ["threads", "asyncio"])
+def test_fetch_jobs_keeps_job_ids_apart(engine):
+    sources = [
+        (db.Job(int(job_id), task_type="dict", database=FakeDatabase(make_rows(n))), job_id, [(0, 0, n)])
+        for job_id, n in [("1", 5), ("2", 3)]
+    ]
+    batches = list(commands.fetch_jobs(sources, workers=2, engine=engine, batch_size=2))
+
+    rows = sorted((job_id, row[0], row[-1]) for job_id, _, rows in batches for row in rows)
+    assert rows == [("1", i, "1") for i in range(1, 6)] + [("2", i, "2") for i in range(1, 4)]
+
+
+@pytest.mark.parametrize("engine", const.ENGINES)
+def test_fetch_jobs_needs_a_worker(engine):
+    job = db.Job(1, task_type="dict", database=FakeDatabase(make_rows(3)))
+    with pytest.raises(ValueError):
+        list(commands.fetch_jobs([(job, "1", [(None, None, None)])], 0, engine=engine))
+
+
+def test_run_async_closes_early():
+    closed = []
+
+    async def numbers():
+        try:
+            for i in range(10):
+                yield i
+        finally:
+            closed.append(True)
+
+    items = commands.run_async(numbers)
+    assert [next(items), next(items)] == [0, 1]
+    items.close()
+    assert closed == [True]
+    assert list(commands.run_async(numbers)) == list(range(10))
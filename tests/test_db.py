@@ -0,0 +1,395 @@
+import copy
+import csv
+from contextlib import asynccontextmanager, contextmanager
+
+import attr
+import psycopg2.extensions
+import pytest
+import pytz
+
+from skit_labels import db, metrics
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+        self.params = None
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.closed = True
+
+    def execute(self, query, params=None):
+        self.conn.queries.append((query, params))
+        if "FROM jobs_job" in query:
+            self.result = [("job", "description", {}, "en")]
+            return
+        last_id = (params or {}).get("last_id")
+        limit = (params or {}).get("limit", len(self.conn.rows))
+        rows = [row for row in self.conn.rows if last_id is None or row[-1] > last_id]
+        self.result = rows[:limit]
+
+    def mogrify(self, query, params=None):
+        self.conn.queries.append((query, params))
+        self.params = params
+        return query.encode()
+
+    def copy_expert(self, sql, f):
+        # `conn.copy_lines` are (id, csv line) in id order.
+        last_id, limit = self.params["last_id"], self.params["limit"]
+        lines = [line for id_, line in self.conn.copy_lines if last_id is None or id_ > last_id]
+        f.write("".join(lines[:limit]))
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.copy_lines = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def poll(self):
+        return psycopg2.extensions.POLL_OK
+
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.conn = FakeConnection(rows)
+
+    @contextmanager
+    def connection(self):
+        yield self.conn
+
+    @asynccontextmanager
+    async def async_connection(self):
+        yield self.conn
+
+
+def make_rows(n):
+    return [({"id": i}, '["tag"]', i % 2 == 0, None, i) for i in range(1, n + 1)]
+
+
+@pytest.mark.parametrize("n_rows, batch_size", [(0, 3), (7, 3), (9, 3), (2, 10)])
+def test_iter_batches_keyset_pagination(n_rows, batch_size):
+    database = FakeDatabase(make_rows(n_rows))
+    job = db.Job(1, task_type="dict", database=database)
+
+    batches = list(job.iter_batches(batch_size=batch_size))
+
+    assert all(len(batch) <= batch_size for batch in batches)
+    items = [item for batch in batches for item in batch]
+    assert [task.id for task, _, _ in items] == list(range(1, n_rows + 1))
+    assert [task.is_gold for task, _, _ in items] == [i % 2 == 0 for i in range(1, n_rows + 1)]
+
+    page_queries = [q for q in database.conn.queries if "ORDER BY jobs_data.id" in q[0]]
+    assert "jobs_data.id >" not in page_queries[0][0]
+    assert all(params["limit"] == batch_size for _, params in page_queries)
+
+
+def test_labelstudio_pages_cross_task_completions():
+    # Task "a" has three completions, the first page ends after two of them.
+    rows = [
+        ("a", {}, 1, None, "[]", 1),
+        ("a", {}, 1, None, "[]", 2),
+        ("a", {}, 1, None, "[]", 3),
+        ("b", {}, 1, None, "[]", 4),
+    ]
+    database = FakeDatabase(rows)
+    job = db.LabelstudioJob(1, database=database)
+
+    pages = list(job.iter_rows(batch_size=2))
+
+    assert [row for page in pages for row in page] == rows
+    query, params = database.conn.queries[1]
+    assert "AND completion_id > %(last_id)s" in query and params["last_id"] == 2
+    assert "ORDER BY completion_id" in query
+    assert "task_completion.id as \"completion_id\"" in query
+
+
+def test_labelstudio_fingerprint_follows_edits():
+    database = FakeDatabase([(2, "2022-01-02")])
+    job = db.LabelstudioJob(1, database=database)
+
+    assert job.fingerprint() == [2, "2022-01-02"]
+    query, _ = database.conn.queries[0]
+    assert "max(task_completion.updated_at)" in query
+
+
+def test_copy_rows_parses_csv(monkeypatch):
+    def cast(value, cur):
+        assert not cur.closed
+        return value and f"cast {value}"
+
+    monkeypatch.setattr(psycopg2.extensions, "PYDATETIMETZ", cast)
+    monkeypatch.setattr(db.const, "COPY_PAGE_BATCHES", 2)
+    database = FakeDatabase([])
+    database.conn.copy_lines = [
+        (1, '"{""text"": ""a, \\""b\\""\\nc""}","[{""type"": ""intent""}]",t,2022-01-01 10:00:00.5+05:30,1\n'),
+        (2, '{},null,f,,2\n'),
+    ] + [(i, f'{{}},null,f,,{i}\n') for i in range(3, 8)]
+    job = db.Job(1, task_type="dict", database=database)
+
+    batches = list(job.copy_rows(batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 2, 2, 1]
+    first, second = batches[0]
+    assert first == ('{"text": "a, \\"b\\"\\nc"}', '[{"type": "intent"}]', True, "cast 2022-01-01 10:00:00.5+05:30", 1)
+    assert isinstance(first[0], db.RawJSON) and isinstance(first[1], db.RawJSON)
+    assert db.codec.loads(first[0]) == {"text": 'a, "b"\nc'}
+    assert second == ("{}", "null", False, None, 2)
+    assert [row[-1] for batch in batches for row in batch] == list(range(1, 8))
+    # Pages of two batches, each after the last id of the one before.
+    copies = [params for query, params in database.conn.queries if "COPY" in query]
+    assert [params["last_id"] for params in copies] == [None, 4]
+    assert all(params["limit"] == 4 for params in copies)
+
+
+def test_copy_rows_reads_large_fields(monkeypatch):
+    monkeypatch.setattr(psycopg2.extensions, "PYDATETIMETZ", lambda value, cur: value)
+    text = "a" * (2**17 + 1)
+    database = FakeDatabase([])
+    database.conn.copy_lines = [(1, f'"{{""text"": ""{text}""}}",null,f,,1\n')]
+    job = db.Job(1, task_type="dict", database=database)
+
+    (batch,) = job.copy_rows(batch_size=2)
+
+    assert db.codec.loads(batch[0][0]) == {"text": text}
+    assert csv.field_size_limit() == 2**17
+
+
+def test_fetch_page_counts_json_text():
+    class Cursor:
+        def fetchall(self):
+            return [(db.loads_counted('{"a": 1}'), db.loads_counted("[]"))]
+
+    db.loads_counted('"not part of the page"')
+    metrics.reset()
+    assert db.fetch_page(Cursor()) == [({"a": 1}, [])]
+    assert metrics.report()["counters"] == {"bytes_fetched": 10, "rows_fetched": 1}
+
+
+def test_job_stats_grouping_sets():
+    # (total, tagged, gold, tag, day, GROUPING(tag, day))
+    database = FakeDatabase(
+        [
+            (5, 3, 1, None, None, 3),
+            (3, 3, 1, '["a"]', None, 1),
+            (2, 0, 0, None, None, 1),
+            (2, 1, 0, None, "2022-01-01", 2),
+            (3, 2, 1, None, "2022-01-02", 2),
+        ]
+    )
+    job = db.Job(1, task_type="dict", database=database)
+
+    stats = job.stats(breakdowns=["tag", "day", "gold"])
+
+    assert stats == {
+        "total": 5,
+        "tagged": 3,
+        "untagged": 2,
+        "gold": 1,
+        "tags": {'["a"]': {"total": 3, "tagged": 3, "untagged": 0, "gold": 1}},
+        "days": {
+            "2022-01-01": {"total": 2, "tagged": 1, "untagged": 1, "gold": 0},
+            "2022-01-02": {"total": 3, "tagged": 2, "untagged": 1, "gold": 1},
+        },
+    }
+    query = database.conn.queries[-1][0]
+    assert query.count("FROM jobs_task") == 1
+    assert "GROUPING SETS ((), (jobs_task.tag::text), (jobs_data.created_at::date))" in query
+
+
+def test_job_sample_filter():
+    database = FakeDatabase(make_rows(3))
+    job = db.Job(1, task_type="dict", database=database, sample_fraction=0.25)
+
+    list(job.iter_batches(batch_size=10))
+
+    assert f"{db.SAMPLE_HASH} < {2**30}" in database.conn.queries[-1][0]
+    assert db.SAMPLE_HASH not in job._filters(sample=False)
+    with pytest.raises(ValueError):
+        db.Job(1, database=database, sample_fraction=1.5)
+
+
+def test_job_value_filters():
+    database = FakeDatabase(make_rows(3))
+    filters = {"tag": ["_confirm_", "it's"], "state": ["COF"], "is_gold": ["true"]}
+    job = db.Job(1, task_type="dict", database=database, filters=filters)
+
+    list(job.iter_batches(batch_size=10))
+
+    query = database.conn.queries[-1][0]
+    assert query.count("jsonb_path_exists") == 2
+    assert f"jobs_data.data->>'state' = {db.sql_text('COF')}" in query
+    assert "jobs_task.is_gold = true" in query
+    assert "it's" not in query
+    with pytest.raises(ValueError):
+        db.Job(1, database=database, filters={"state'": ["COF"]})
+    with pytest.raises(ValueError):
+        db.Job(1, database=database, filters={"is_gold": ["yes"]})
+
+
+def test_job_fields_projection():
+    database = FakeDatabase(make_rows(3))
+    job = db.Job(1, task_type="dict", database=database, fields=["data_source"])
+
+    list(job.iter_batches(batch_size=10))
+
+    query = database.conn.queries[-1][0]
+    assert "jsonb_each(jobs_data.data::jsonb)" in query
+    assert "'data_source'" in query
+    conversations = db.Job(1, database=database, fields=["data_source", "state"])
+    assert "'conversation_uuid'" in conversations._data_column()
+    assert conversations.fields.count("state") == 1
+    assert "jsonb_each" not in db.Job(1, task_type="dict", database=database)._data_column()
+    with pytest.raises(ValueError):
+        db.Job(1, task_type="dict", database=database, fields=["state'"])
+    with pytest.raises(ValueError):
+        db.Job(1, task_type="simulated_call", database=database, fields=["state"])
+
+
+def test_sqlite_checkpoints(tmp_path):
+    sdb = db.SqliteDatabase(str(tmp_path / "job.sqlite"))
+    sdb.start_download({"job_id": 1, "full": False}, [(0, 10), (10, 20)])
+    row = ("a", {"x": 1}, ["tag"], False, None, "1")
+
+    sdb.insert_rows([row, row], checkpoint=(0, 4))
+    sdb.insert_rows([row], checkpoint=(10, 20))
+
+    assert sdb.get_metadata() == {"job_id": 1, "full": False}
+    assert sdb.pending_ranges() == [(0, 4, 10)]
+    sdb.verify()
+
+    sdb.insert_rows([row])
+    with pytest.raises(RuntimeError):
+        sdb.verify()
+
+
+def test_sqlite_mark_complete_after_upsert(tmp_path):
+    sdb = db.SqliteDatabase(str(tmp_path / "job.sqlite"))
+    sdb.start_download({"job_id": 1, "full": False}, [(0, 10), (10, 20)])
+    sdb.insert_rows([("a", {"x": 1}, ["tag"], False, None, "1")], checkpoint=(0, 10))
+    sdb.insert_rows([], checkpoint=(10, 20))
+
+    sdb.upsert_rows([("a", {"x": 2}, ["tag"], False, None, "1"), ("b", {"x": 3}, [], False, None, "2")])
+    sdb.mark_complete()
+
+    assert sdb.pending_ranges() == []
+    sdb.verify()
+
+
+def test_sqlite_stores_raw_json_as_is(tmp_path):
+    sdb = db.SqliteDatabase(str(tmp_path / "job.sqlite"))
+    sdb.insert_rows(
+        [
+            (1, db.RawJSON('{"b": 1, "a": "é"}'), db.RawJSON('"tag"'), True, None, "1"),
+            (2, {"a": 1}, "tag", False, None, "1"),
+        ]
+    )
+    stored = sdb.conn.execute("SELECT data, tag FROM data ORDER BY data_id").fetchall()
+    assert stored == [('{"b": 1, "a": "é"}', '"tag"'), ('{"a":1}', '"tag"')]
+
+
+def test_sqlite_bulk_load(tmp_path):
+    sdb = db.SqliteDatabase(str(tmp_path / "job.sqlite"))
+    with sdb.bulk_load():
+        assert sdb.conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        sdb.insert_rows([(1, {"a": 1}, "tag", False, None, "1")], checkpoint=(0, 1))
+
+    assert sdb.conn.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+    indexes = {
+        name for name, in sdb.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    }
+    assert {"data_data_id", "data_tagged_time", "data_is_gold"} <= indexes
+    assert list(tmp_path.iterdir()) == [tmp_path / "job.sqlite"]
+
+
+TASKS = {
+    "conversation": [
+        {
+            "call_uuid": "c1",
+            "conversation_uuid": "u1",
+            "alternatives": [[{"transcript": "नमस्ते", "confidence": 0.9}]],
+            "audio_url": "a.wav",
+            "state": "COF",
+            "reftime": "2022-01-01T10:00:00+00:00",
+            "extra": {"nested": [1, 2]},
+        },
+        {
+            "call_id": 2,
+            "conversation_id": 3,
+            "utterances": [[{"transcript": "yes"}]],
+            "audio_url": None,
+            "state": "END",
+            "reftime": "not a date",
+            "prediction": {"intent": "_confirm_"},
+        },
+    ],
+    "dict": [{"a": 1}, {"b": [1, {"c": 2}]}],
+    "audio_segment": [{"conversation_id": 1, "audio_url": "a.wav", "other": 1}],
+    "call_transcription": [{"turns": [{"id": 1, "type": "INPUT", "text": "hi"}]}],
+}
+
+
+@pytest.mark.parametrize("task_type", TASKS)
+def test_build_tasks_matches_asdict(task_type):
+    tz = pytz.timezone("Asia/Kolkata")
+    rows = [
+        (task, ["tag"], i % 2, "2022-01-01", 100 + i)
+        for i, task in enumerate(TASKS[task_type])
+    ]
+
+    expected = []
+    for task_dict, tag, is_gold, tagged_time, data_id in copy.deepcopy(rows):
+        task = db.build_task(task_dict, task_type, data_id, tz=tz)
+        task_dict = dict(task) if isinstance(task, dict) else attr.asdict(task)
+        expected.append((task.id, task_dict, tag, bool(is_gold), tagged_time, "1"))
+
+    built = db.build_tasks(copy.deepcopy(rows), task_type, "1", tz=tz)
+    assert built == expected
+    assert [list(task_dict) for _, task_dict, *_ in built] == [
+        list(task_dict) for _, task_dict, *_ in expected
+    ]
+
+
+def test_build_tasks_rejects_unknown_type():
+    with pytest.raises(TypeError):
+        db.build_tasks([], "unknown", "1")
+
+
+REFTIMES = [
+    "2022-01-01T10:00:00.123456+00:00",
+    "2022-01-01 10:00:00+00:00",
+    "2022-03-13T09:59:59.5+00:00",
+    "2022-03-13T10:00:00.120+00:00",
+    "2022-11-06T08:30:00-03:00",
+    "2021-06-30T23:59:59.000001+05:30",
+    "2022-01-01T10:00:00",
+    "2022-01-01T10:00:00Z",
+    "2300-01-01T00:00:00+00:00",
+    "1850-01-01T00:00:00+00:00",
+    "not a date",
+    None,
+    1641031200,
+]
+
+
+@pytest.mark.parametrize("timezone", ["UTC", "Asia/Kolkata", "America/Los_Angeles"])
+def test_update_reftimes_matches_update_reftime(timezone):
+    tz = pytz.timezone(timezone)
+    assert db.update_reftimes(REFTIMES, tz) == [db.update_reftime(r, tz) for r in REFTIMES]
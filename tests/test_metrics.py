@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+from skit_labels import metrics
+
+
+def test_metrics_report(tmp_path):
+    metrics.reset()
+    with metrics.timed("query"):
+        metrics.count("rows_fetched", 10)
+    with pytest.raises(ValueError):
+        with metrics.timed("query"):
+            raise ValueError
+    metrics.count("rows_fetched", 5)
+    metrics.count("retries")
+
+    path = tmp_path / "metrics.json"
+    metrics.write(str(path), command="download")
+    report = json.loads(path.read_text())
+    assert report["command"] == "download"
+    assert report["phases"]["query"]["calls"] == 2
+    assert report["counters"] == {"retries": 1, "rows_fetched": 15}
+
+    metrics.reset()
+    assert metrics.report() == {"phases": {}, "counters": {}}
@@ -0,0 +1,40 @@
+import os
+import threading
+
+from skit_labels import commands
+from skit_labels import profiling
+
+
+def build_dataset(job_id, data_frame):
+    return [bytearray(2**20) for _ in range(4)][:1]
+
+
+def test_memory_profile_stages(tmp_path, monkeypatch):
+    monkeypatch.setattr(commands, "build_dataset", build_dataset)
+    profiler = profiling.MemoryProfiler(top=5)
+    with profiler.running():
+        dataset = commands.build_dataset("1", None)
+    assert commands.build_dataset is build_dataset
+
+    stage = profiler.stages["build_dataset"]
+    assert stage["calls"] == 1
+    assert stage["peak"] >= 4 * 2**20 > stage["net"] >= 2**20
+    assert profiler.peak >= stage["peak"]
+    assert len(stage["top_lines"]) <= 5
+
+    (path,) = profiler.write(str(tmp_path / "job.csv"))
+    assert path.endswith("job.csv.memory.txt")
+    assert "build_dataset" in open(path).read()
+    del dataset
+
+
+def test_cpu_profile_threads(tmp_path):
+    profiler = profiling.CpuProfiler(top=5)
+    with profiler.running():
+        thread = threading.Thread(target=sum, args=(range(1000),))
+        thread.start()
+        thread.join()
+    assert len(profiler.profiles) == 2
+
+    paths = profiler.write(str(tmp_path / "job.csv"))
+    assert [os.path.basename(path) for path in paths] == ["job.csv.cpu.prof", "job.csv.cpu.txt"]
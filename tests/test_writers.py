@@ -0,0 +1,132 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from skit_labels.db import RawJSON
+from skit_labels.writers import JSONLWriter, ParquetWriter, ShardedWriter, sha256sum, shard_of
+
+
+def open_jsonl_for_reading(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        import zstandard
+
+        return io.TextIOWrapper(
+            zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8"
+        )
+    return open(path, encoding="utf-8")
+
+
+def test_parquet_writer_row_groups(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "job.parquet")
+    writer = ParquetWriter(path)
+    writer.insert_rows(
+        [
+            (1, {"text": "hi", "data_id": "x", "meta": {"a": 1}}, ["tag"], True, "2022-01-01 10:00:00+00:00", "1"),
+            (2, RawJSON('{"text": "hello"}'), None, False, None, "1"),
+        ]
+    )
+    writer.insert_rows([(3, {"text": "bye", "extra": 1}, "tag", False, None, "1")])
+    writer.close()
+
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.num_row_groups == 2
+    table = parquet_file.read()
+    assert table.column_names == [
+        "data_id", "tag", "is_gold", "tagged_time", "job_id", "text", "data.data_id", "meta", "extra_data"
+    ]
+    assert table.column("data_id").to_pylist() == ["1", "2", "3"]
+    assert table.column("tag").to_pylist() == ['["tag"]', "null", '"tag"']
+    assert table.column("meta").to_pylist() == ['{"a": 1}', None, None]
+    assert table.column("extra_data").to_pylist() == [None, None, '{"extra": 1}']
+
+
+@pytest.mark.parametrize(
+    "first, later, stored",
+    [
+        # An int column which later has a float.
+        (1, 1.5, ["1", "1.5"]),
+        # None in the first batch, an int later.
+        (None, 2, [None, "2"]),
+        # A nested value after a string.
+        ("a", [1, 2], ["a", "[1, 2]"]),
+    ],
+)
+def test_parquet_writer_later_batches_keep_values(tmp_path, first, later, stored):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "job.parquet")
+    writer = ParquetWriter(path)
+    writer.insert_rows([(1, {"n": first}, None, False, None, "1")])
+    # data_id turns from int to str.
+    writer.insert_rows([("x", {"n": later}, None, False, None, "1")])
+    writer.close()
+
+    table = pq.read_table(path)
+    assert table.column("data_id").to_pylist() == ["1", "x"]
+    assert table.column("n").to_pylist() == stored
+
+
+def test_sharded_parquet_writer_shares_schema(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    writer = ShardedWriter(str(tmp_path), ".parquet", 4)
+    writer.insert_rows([(i, {"n": i} if i % 2 else {"text": str(i)}, None, False, None, "1") for i in range(8)])
+    writer.insert_rows([(i, {"n": i / 2}, None, False, None, "1") for i in range(8, 100)])
+    writer.close()
+
+    schemas = [pq.read_schema(path) for path in writer.paths]
+    assert all(schema == schemas[0] for schema in schemas)
+    assert schemas[0].names == [
+        "data_id", "tag", "is_gold", "tagged_time", "job_id", "text", "n", "extra_data"
+    ]
+
+
+def test_parquet_writer_empty(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "job.parquet")
+    ParquetWriter(path).close()
+    assert pq.read_table(path).num_rows == 0
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.gz", ".jsonl.zst"])
+def test_jsonl_writer(tmp_path, suffix):
+    if suffix == ".jsonl.zst":
+        pytest.importorskip("zstandard")
+    path = str(tmp_path / f"job{suffix}")
+    writer = JSONLWriter(path)
+    writer.insert_rows(
+        [
+            (1, {"text": "नमस्ते"}, ["tag"], True, "2022-01-01 10:00:00+00:00", "1"),
+            (2, RawJSON('{\n  "text": "hello"\n}'), RawJSON("null"), False, None, "1"),
+        ]
+    )
+    writer.insert_rows([])
+    writer.close()
+
+    with open_jsonl_for_reading(path) as f:
+        lines = f.read().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"data_id": 1, "data": {"text": "नमस्ते"}, "tag": ["tag"], "is_gold": True, "tagged_time": "2022-01-01 10:00:00+00:00", "job_id": 1},
+        {"data_id": 2, "data": {"text": "hello"}, "tag": None, "is_gold": False, "tagged_time": None, "job_id": 1},
+    ]
+
+
+def test_sharded_writer(tmp_path):
+    writer = ShardedWriter(str(tmp_path), ".jsonl", 4)
+    for start in range(0, 200, 50):
+        writer.insert_rows([(i, {"n": i}, None, False, None, "1") for i in range(start, start + 50)])
+    writer.close()
+
+    with open(tmp_path / "manifest.json") as f:
+        manifest = json.load(f)
+    assert manifest["shards"] == 4 and manifest["rows"] == 200
+    for shard, item in enumerate(manifest["files"]):
+        path = str(tmp_path / item["file"])
+        with open(path) as f:
+            data_ids = [json.loads(line)["data_id"] for line in f]
+        assert len(data_ids) == item["rows"] > 0
+        assert all(shard_of(data_id, 4) == shard for data_id in data_ids)
+        assert sha256sum(path) == item["sha256"]